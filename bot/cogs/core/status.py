@@ -2,6 +2,13 @@ import discord
 from discord.ext import commands
 
 from bot.utils import checks
+from bot.utils.loop_monitor import LoopMonitor
+
+from bot.config import config as BOT_CONFIG
+COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
+
+# Milliseconds the event loop may be blocked for before the blocking stack is logged
+_LAG_THRESHOLD = getattr(COG_CONFIG, 'LAG_THRESHOLD_MS', 250) / 1000
 
 
 class Status(commands.Cog):
@@ -21,6 +28,14 @@ class Status(commands.Cog):
     @commands.check(checks.is_owner)
     async def status(self, ctx: commands.Context):
         """Shows some basic information about the bot's current status."""
+        lag = []
+        for minutes in (1, 15):
+            p50, p99 = self.bot.loop_monitor.histogram(minutes).percentiles(50, 99)
+            lag.append(f'{minutes}m: p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms')
+        spikes = self.bot.loop_monitor.spikes
+        if spikes:
+            lag.append(f'Last spike: {spikes[-1][1] * 1000:.0f}ms at {spikes[-1][0]:%H:%M:%S UTC}')
+
         await ctx.send(
             embed=discord.Embed(
                 title=f'{self.bot.user.name} v{self.bot.__version__} Status:',
@@ -35,9 +50,15 @@ class Status(commands.Cog):
                 name="Started at:", value=self.bot._start_time.strftime('%F %H:%M:%S UTC')
             ).add_field(
                 name="Cogs loaded:", value=len(self.bot.cogs)
+            ).add_field(
+                name="Event loop lag:", value='\n'.join(lag), inline=False
             )
         )
 
 
 def setup(bot: commands.Bot):
+    if not hasattr(bot, 'loop_monitor'):
+        bot.loop_monitor = LoopMonitor(bot.loop, threshold=_LAG_THRESHOLD, log=bot.log)
+        bot.loop_monitor.start()
+
     bot.add_cog(Status(bot))
@@ -1,42 +1,301 @@
 import asyncio
+import datetime
+import functools
+import json
+import os
+import re
+import shlex
+import threading
+import time
 
-from collections import Counter
+from collections import Counter, defaultdict
+from typing import Optional
 
 # import discord
 from discord.ext import commands, tasks
 
 import asyncpg
-from donphan import Column, SQLType, Table
+from donphan import Column, MaybeAcquire, SQLType, Table
 
-from bot.utils import checks
+from bot.utils import checks, converters
+from bot.utils.heavy_hitters import HeavyHitters
+from bot.utils.histogram import Histogram
+from bot.utils.hyperloglog import HyperLogLog
 
 from bot.config import config as BOT_CONFIG
 COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
 
+# Number of buffered commands which triggers a flush before the next tick
+_FLUSH_THRESHOLD = 500
+# Maximum number of commands buffered in memory before they are spilled to disk
+_MAX_BUFFERED = 10000
+
+# Append-only file commands are spilled to while the database is unreachable
+_SPILL_PATH = f'{BOT_CONFIG.APP_NAME}.commands.spill'
+_REPLAY_PATH = f'{_SPILL_PATH}.replay'
+# Number of spilled commands read from disk at a time when replaying
+_REPLAY_CHUNK = 5000
+
+_spill_lock = threading.Lock()
+
+# Seconds query results are reused for, and how many distinct queries are kept
+_QUERY_CACHE_TTL = 30
+_QUERY_CACHE_SIZE = 128
+
+# Distinct user sketches take at most 2 ** precision bytes each, with a standard error of around 3%,
+# sketches of few users only store the registers which are set
+_SKETCH_PRECISION = 10
+
+# Number of most active users and guilds tracked, and the windows and intervals they are tracked over
+_HEAVY_HITTERS = 10
+_HEAVY_HITTER_WINDOWS = {'5m': (300, 10), '1h': (3600, 12)}
+
 
 class _Commands(Table):
     id: SQLType.Serial = Column(primary_key=True, auto_increment=True)
-    guild_id: SQLType.BigInt = Column(index=True)
+    guild_id: SQLType.BigInt
     channel_id: SQLType.BigInt
-    author_id: SQLType.BigInt = Column(index=True)
-    used_at: SQLType.Timestamp = Column(index=True)
+    author_id: SQLType.BigInt
+    used_at: SQLType.Timestamp
     prefix: str
-    command: str = Column(index=True)
-    failed: bool = Column(index=True)
+    command: str
+    failed: bool
+    duration: SQLType.DoublePrecision
+
+
+class _HourlyCommands(Table):
+    hour: SQLType.Timestamp = Column(primary_key=True)
+    command: str = Column(primary_key=True)
+    guild_id: SQLType.BigInt = Column(primary_key=True)
+    failed: bool = Column(primary_key=True)
+    uses: int
+
+
+class _CommandUsers(Table):
+    day: SQLType.Date = Column(primary_key=True)
+    command: str = Column(primary_key=True)
+    guild_id: SQLType.BigInt = Column(primary_key=True)
+    sketch: SQLType.Bytea
+
+
+class _GlobalCommandUsers(Table):
+    day: SQLType.Date = Column(primary_key=True)
+    command: str = Column(primary_key=True)
+    sketch: SQLType.Bytea
+
+
+_COLUMNS = [column.name for column in list(_Commands._columns.values())[1:]]
+
+# Number of months of raw command history kept before it is reduced to the hourly rollups
+_RETENTION_MONTHS = getattr(COG_CONFIG, 'RETENTION_MONTHS', 12)
+
+_COMMANDS_TABLE = _Commands._name.rpartition('.')[2]
+_PARTITION_PATTERN = re.compile(rf'{_COMMANDS_TABLE}(_legacy)?_p(\d{{4}})(\d{{2}})')
+
+# Aggregate queries are answered by the rollups and time ranges by partition pruning,
+# so the raw table only carries the indexes needed for guild, user and command lookups
+_INDEXES = f"""
+CREATE INDEX IF NOT EXISTS {_COMMANDS_TABLE}_used_at_brin_idx ON {_Commands._name} USING brin (used_at);
+CREATE INDEX IF NOT EXISTS {_COMMANDS_TABLE}_guild_id_used_at_idx ON {_Commands._name} (guild_id, used_at);
+CREATE INDEX IF NOT EXISTS {_COMMANDS_TABLE}_author_id_used_at_idx ON {_Commands._name} (author_id, used_at);
+CREATE INDEX IF NOT EXISTS {_COMMANDS_TABLE}_command_used_at_idx ON {_Commands._name} (command, used_at);
+"""
+
+# Invokes outside of a guild are rolled up under a guild_id of 0
+_ROLLUP = f"""
+INSERT INTO {_HourlyCommands._name} (hour, command, guild_id, failed, uses)
+    SELECT * FROM unnest($1::timestamp[], $2::text[], $3::bigint[], $4::boolean[], $5::integer[])
+ON CONFLICT (hour, command, guild_id, failed) DO UPDATE SET uses = {_HourlyCommands._name}.uses + excluded.uses
+"""
+
+_ROLLUP_RANGE = f"""
+INSERT INTO {_HourlyCommands._name} (hour, command, guild_id, failed, uses)
+    SELECT date_trunc('hour', used_at), command, COALESCE(guild_id, 0), failed, COUNT(*)
+    FROM {_Commands._name}
+    WHERE used_at >= $1 AND used_at < $2
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+class _QueryFilters(commands.Converter):
+    """Parses filters of the form `guild=<guild> user=<user> command="<name>" since=7d until=1d`."""
+    _CONVERTERS = {
+        'guild': converters.Guild,
+        'user': converters.User,
+        'command': None,
+        'since': converters.Duration,
+        'until': converters.Duration,
+    }
+
+    async def convert(self, ctx: commands.Context, argument: str):
+        filters = {}
+        for token in shlex.split(argument):
+            key, sep, value = token.partition('=')
+            if not sep or key not in self._CONVERTERS:
+                raise commands.BadArgument(f'Unknown filter "{token}", expected one of: {", ".join(self._CONVERTERS)}.')
+
+            converter = self._CONVERTERS[key]
+            filters[key] = value if converter is None else await converter().convert(ctx, value)
+
+        return filters
+
+
+class _SketchStore:
+    """Merges distinct user sketches into a table keyed by the given columns.
+
+    Stored sketches are locked and merged with those being written, so each
+    process sharing the database only ever adds to a sketch.
+    """
+
+    def __init__(self, table, columns):
+        self.columns = [name for name, _ in columns]
+        names = ', '.join(self.columns)
+        arrays = ', '.join(f'${i}::{type}[]' for i, (_, type) in enumerate(columns, 1))
+        sketches = f'${len(columns) + 1}::bytea[]'
+
+        # Rows are locked in key order so concurrent flushes cannot deadlock
+        self._fetch = f"""
+            SELECT s.* FROM {table._name} s JOIN unnest({arrays}) AS k ({names}) USING ({names})
+            ORDER BY {names} FOR UPDATE OF s
+        """
+        self._insert = f"""
+            INSERT INTO {table._name} ({names}, sketch) SELECT * FROM unnest({arrays}, {sketches})
+            ON CONFLICT DO NOTHING RETURNING {names}
+        """
+        self._update = f"""
+            UPDATE {table._name} s SET sketch = k.sketch FROM unnest({arrays}, {sketches}) AS k ({names}, sketch)
+            WHERE {' AND '.join(f's.{name} = k.{name}' for name in self.columns)}
+        """
+
+    async def _merge_stored(self, connection, sketches, keys):
+        stored = set()
+        for record in await connection.fetch(self._fetch, *map(list, zip(*keys))):
+            key = tuple(record[name] for name in self.columns)
+            sketches[key].merge(HyperLogLog.from_bytes(record['sketch']))
+            stored.add(key)
+        return stored
+
+    async def store(self, connection, sketches):
+        """Merges sketches keyed by their column values into the table, within a transaction.
+
+        The sketches are updated in place to include the registers already stored.
+        """
+        if not sketches:
+            return
+
+        keys = sorted(sketches)
+        stored = await self._merge_stored(connection, sketches, keys)
+
+        new = [key for key in keys if key not in stored]
+        if new:
+            records = await connection.fetch(self._insert, *map(list, zip(*new)), [sketches[key].to_bytes() for key in new])
+
+            # Keys inserted by another process since they were fetched are merged with its sketch instead
+            inserted = {tuple(record) for record in records}
+            raced = [key for key in new if key not in inserted]
+            if raced:
+                stored |= await self._merge_stored(connection, sketches, raced)
+
+        if stored:
+            stored = sorted(stored)
+            await connection.execute(self._update, *map(list, zip(*stored)), [sketches[key].to_bytes() for key in stored])
+
+
+_SKETCHES = _SketchStore(_CommandUsers, [('day', 'date'), ('command', 'text'), ('guild_id', 'bigint')])
+_GLOBAL_SKETCHES = _SketchStore(_GlobalCommandUsers, [('day', 'date'), ('command', 'text')])
+
+
+def _month(dt, offset=0):
+    year, month = divmod(dt.year * 12 + dt.month - 1 + offset, 12)
+    return datetime.datetime(year, month + 1, 1)
+
+
+def _rollup(records):
+    uses = Counter((used_at.replace(minute=0, second=0, microsecond=0), command, guild_id or 0, failed)
+                   for guild_id, _, _, used_at, _, command, failed, *_ in records)
+    return [list(column) for column in zip(*((*key, count) for key, count in uses.items()))]
+
+
+def _write_spill(batch):
+    lines = []
+    for record in batch:
+        record = list(record)
+        record[3] = record[3].isoformat()
+        lines.append(json.dumps(record))
+        lines.append('\n')
+    data = memoryview(''.join(lines).encode('UTF-8'))
+
+    with _spill_lock:
+        fd = os.open(_SPILL_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            start = os.lseek(fd, 0, os.SEEK_END)
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+            except OSError:
+                # Remove a partially written batch so it can be spilled again in full
+                os.ftruncate(fd, start)
+                raise
+        finally:
+            os.close(fd)
+
+
+def _claim_spill():
+    # Resume a replay which previously failed before starting on newer spills
+    with _spill_lock:
+        if os.path.exists(_REPLAY_PATH):
+            return _REPLAY_PATH
+        if os.path.exists(_SPILL_PATH):
+            os.replace(_SPILL_PATH, _REPLAY_PATH)
+            return _REPLAY_PATH
+    return None
+
+
+def _read_spill(f, count):
+    records = []
+    for line in f:
+        record = json.loads(line)
+        record[3] = datetime.datetime.fromisoformat(record[3])
+
+        # Records spilled before columns were added are padded with nulls
+        record.extend(None for _ in range(len(_COLUMNS) - len(record)))
+        records.append(tuple(record))
+        if len(records) == count:
+            break
+    return records
 
 
 class CommandStats(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self._batch_lock = asyncio.Lock(loop=bot.loop)
         self._data_batch = []
+        self._flush_task = None
+        self._spill_task = None
+        self._replaying = False
+        self._query_cache = {}
+
+        # Distinct user sketches keyed by day, command and guild, or None for all guilds,
+        # with those changed since the last flush
+        self._sketches = {}
+        self._dirty_sketches = set()
+        self._sketch_lock = asyncio.Lock()
+
+        # Most active users and guilds in each window
+        self._heavy_hitters = {
+            kind: {name: HeavyHitters(_HEAVY_HITTERS, window, intervals) for name, (window, intervals) in _HEAVY_HITTER_WINDOWS.items()}
+            for kind in ('users', 'guilds')
+        }
+
+        bot.invoke = self._invoke
 
         self.bulk_insert_loop.add_exception_type(
             asyncpg.PostgresConnectionError)
         self.bulk_insert_loop.start()
+        self.partition_loop.add_exception_type(
+            asyncpg.PostgresConnectionError)
 
-    @commands.command(name='commandstats', aliases=['command_stats'], hidden=True)
+    @commands.group(name='commandstats', aliases=['command_stats'], hidden=True, invoke_without_command=True)
     @commands.check(checks.is_owner)
     async def commandstats(self, ctx: commands.Context, limit=20):
         """Retrieves basic information about command statistics."""
@@ -52,14 +311,306 @@ class CommandStats(commands.Cog):
             common = self.bot.command_stats.most_common()[limit:]
 
         width = len(max(self.bot.command_stats, key=len))
-        output = '\n'.join(f'{k:<{width}}: {c}' for k, c in common)
+        lines = []
+        for k, c in common:
+            line = f'{k:<{width}}: {c}'
+            if k in self.bot.command_latencies:
+                p50, p95, p99 = self.bot.command_latencies[k].percentiles(50, 95, 99)
+                line += f' (p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms)'
+            lines.append(line)
+        output = '\n'.join(lines)
 
         await ctx.send(f'{total} command invokes observed ({cph:.2f}/hour):\n```\n{output}\n```')
 
+    @commandstats.command(name='history')
+    @commands.check(checks.is_owner)
+    async def commandstats_history(self, ctx: commands.Context, since: converters.Duration,
+                                   until: Optional[converters.Duration] = None, guild: converters.Guild = None, limit: int = 20):
+        """Retrieves command statistics over a time range from the hourly rollups.
+
+        Args:
+            since: How long ago the range starts, e.g. `7d`.
+            until: How long ago the range ends, defaults to now.
+            guild: Restricts the statistics to a single guild.
+            limit: The number of commands to show.
+        """
+        now = datetime.datetime.utcnow()
+        start, end = now - since, now - (until or datetime.timedelta())
+
+        where = 'hour >= date_trunc(\'hour\', $1::timestamp) AND hour < $2'
+        values = [start, end]
+        if guild is not None:
+            values.append(guild.id)
+            where += f' AND guild_id = ${len(values)}'
+
+        async with MaybeAcquire() as connection:
+            records = await connection.fetch(f"""
+                SELECT command, SUM(uses) AS uses, SUM(uses) FILTER (WHERE failed) AS failures
+                FROM {_HourlyCommands._name}
+                WHERE {where}
+                GROUP BY command
+                ORDER BY uses DESC
+                LIMIT {int(limit)}
+            """, *values)
+
+        if not records:
+            return await ctx.send('No commands were used in that time range.')
+
+        width = max(len(record['command']) for record in records)
+        output = '\n'.join(f'{record["command"]:<{width}}: {record["uses"]} ({record["failures"] or 0} failed)'
+                           for record in records)
+
+        await ctx.send(f'Command invokes from {start:%Y-%m-%d %H:00} to {end:%Y-%m-%d %H:%M} UTC'
+                       f'{f" in {guild}" if guild is not None else ""}:\n```\n{output}\n```')
+
+    @commandstats.command(name='query')
+    @commands.check(checks.is_owner)
+    async def commandstats_query(self, ctx: commands.Context, *, filters: _QueryFilters = None):
+        """Retrieves command statistics from the full command history.
+
+        Args:
+            filters: Any of `guild=`, `user=`, `command=`, `since=` and `until=`,
+                e.g. `guild=1234 since=7d`.
+        """
+        filters = filters or {}
+
+        # Time windows are relative to the current minute so repeated queries hit the cache
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        conditions, values = [], []
+
+        def add(condition, value):
+            values.append(value)
+            conditions.append(condition.format(f'${len(values)}'))
+
+        if 'guild' in filters:
+            add('guild_id = {}', filters['guild'].id)
+        if 'user' in filters:
+            add('author_id = {}', filters['user'].id)
+        if 'command' in filters:
+            add('command = {}', filters['command'])
+        if 'since' in filters:
+            add('used_at >= {}', now - filters['since'])
+        if 'until' in filters:
+            add('used_at < {}', now - filters['until'])
+
+        records = await self.fetch_cached(f"""
+            SELECT command, COUNT(*) AS uses, COUNT(*) FILTER (WHERE failed) AS failures, AVG(duration) AS duration
+            FROM {_Commands._name}
+            {f'WHERE {" AND ".join(conditions)}' if conditions else ''}
+            GROUP BY command
+            ORDER BY uses DESC
+            LIMIT 20
+        """, *values)
+
+        if not records:
+            return await ctx.send('No commands matched those filters.')
+
+        width = max(len(record['command']) for record in records)
+        lines = []
+        for record in records:
+            line = f'{record["command"]:<{width}}: {record["uses"]} ({record["failures"]} failed'
+            if record['duration'] is not None:
+                line += f', {record["duration"] * 1000:.0f}ms avg'
+            lines.append(line + ')')
+        output = '\n'.join(lines)
+
+        await ctx.send(f'Command invokes matching {len(conditions)} filter(s):\n```\n{output}\n```')
+
+    async def fetch_cached(self, query, *values):
+        """Fetches the results of a query, reusing results fetched in the last few seconds.
+
+        Args:
+            query (str): The query to run.
+            *values: The query's arguments.
+
+        Returns:
+            List[asyncpg.Record]: The query's results.
+        """
+        key = (query, values)
+        now = time.monotonic()
+
+        cached = self._query_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        async with MaybeAcquire() as connection:
+            records = await connection.fetch(query, *values)
+
+        # Drop the oldest result once the cache is full
+        self._query_cache.pop(key, None)
+        if len(self._query_cache) >= _QUERY_CACHE_SIZE:
+            del self._query_cache[next(iter(self._query_cache))]
+        self._query_cache[key] = (now + _QUERY_CACHE_TTL, records)
+
+        return records
+
+    @commandstats.command(name='users')
+    @commands.check(checks.is_owner)
+    async def commandstats_users(self, ctx: commands.Context, since: Optional[converters.Duration] = None,
+                                 guild: converters.Guild = None, limit: int = 20):
+        """Retrieves the approximate number of distinct users of each command.
+
+        Args:
+            since: How far back to count users from, defaults to today.
+            guild: Restricts the counts to a single guild.
+            limit: The number of commands to show.
+        """
+        today = datetime.datetime.utcnow().date()
+        start = today if since is None else (datetime.datetime.utcnow() - since).date()
+
+        # Counts across all guilds are read from the global sketches rather than merging every guild's
+        if guild is None:
+            records = await self.fetch_cached(
+                f'SELECT command, sketch FROM {_GlobalCommandUsers._name} WHERE day >= $1', start)
+        else:
+            records = await self.fetch_cached(
+                f'SELECT command, sketch FROM {_CommandUsers._name} WHERE day >= $1 AND guild_id = $2', start, guild.id)
+
+        # Merge daily sketches, including those not yet flushed
+        guild_id = None if guild is None else guild.id
+        sketches = {}
+        rows = [(r['command'], HyperLogLog.from_bytes(r['sketch'])) for r in records]
+        rows.extend((key[1], sketch) for key, sketch in self._sketches.items() if key[0] >= start and key[2] == guild_id)
+        for command, sketch in rows:
+            if command not in sketches:
+                sketches[command] = HyperLogLog(_SKETCH_PRECISION)
+            sketches[command].merge(sketch)
+
+        if not sketches:
+            return await ctx.send('No commands were used in that time range.')
+
+        counts = sorted(((command, sketch.count()) for command, sketch in sketches.items()), key=lambda c: -c[1])[:limit]
+        width = max(len(command) for command, _ in counts)
+        output = '\n'.join(f'{command:<{width}}: ~{count}' for command, count in counts)
+
+        await ctx.send(f'Distinct users since {start}{f" in {guild}" if guild is not None else ""}:\n```\n{output}\n```')
+
+    @commandstats.command(name='top')
+    @commands.check(checks.is_owner)
+    async def commandstats_top(self, ctx: commands.Context, window: str = '5m'):
+        """Retrieves the users and guilds invoking the most commands recently.
+
+        Args:
+            window: The window to report, one of `5m` or `1h`.
+        """
+        if window not in _HEAVY_HITTER_WINDOWS:
+            raise commands.BadArgument(f'Window must be one of: {", ".join(_HEAVY_HITTER_WINDOWS)}.')
+
+        users = [f'{self.bot.get_user(user_id) or user_id}: ~{count}'
+                 for user_id, count in self._heavy_hitters['users'][window].top()]
+        guilds = [f'{self.bot.get_guild(guild_id) or guild_id}: ~{count}'
+                  for guild_id, count in self._heavy_hitters['guilds'][window].top()]
+
+        users = '\n'.join(users) or 'No commands invoked.'
+        guilds = '\n'.join(guilds) or 'No commands invoked in guilds.'
+        await ctx.send(f'Most active in the last {window}:\n```\nUsers:\n{users}\n\nGuilds:\n{guilds}\n```')
+
+    async def flush_sketches(self):
+        """Persists the distinct user sketches which have changed since the last flush."""
+        async with self._sketch_lock:
+            await self._flush_sketches()
+
+    async def _flush_sketches(self):
+        dirty, self._dirty_sketches = self._dirty_sketches, set()
+        if not dirty:
+            return
+
+        guild_sketches = {key: self._sketches[key] for key in dirty if key[2] is not None}
+        global_sketches = {key[:2]: self._sketches[key] for key in dirty if key[2] is None}
+
+        try:
+            async with MaybeAcquire() as connection:
+                async with connection.transaction():
+                    await _SKETCHES.store(connection, guild_sketches)
+                    await _GLOBAL_SKETCHES.store(connection, global_sketches)
+        except asyncpg.TransactionRollbackError:
+            # Deadlocks with another process's flush are retried with the next flush
+            self._dirty_sketches |= dirty
+            return
+        except Exception:
+            self._dirty_sketches |= dirty
+            raise
+
+        # Sketches for previous days are no longer needed in memory once persisted
+        today = datetime.datetime.utcnow().date()
+        for key in [key for key in self._sketches if key[0] < today and key not in self._dirty_sketches]:
+            del self._sketches[key]
+
+    async def _copy(self, records, *, connection=None):
+        # Records and their rollups are written together so the rollups never drift from the raw table
+        async with MaybeAcquire(connection) as connection:
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    _Commands._name.rpartition('.')[2], schema_name=_Commands.schema, columns=_COLUMNS, records=records)
+                await connection.execute(_ROLLUP, *_rollup(records))
+
     async def bulk_insert(self):
-        if self._data_batch:
-            await _Commands.insert_many(list(_Commands._columns.values())[1:], self._data_batch)
-            self._data_batch.clear()
+        # Swap in an empty buffer so commands can be registered while the batch is written
+        batch, self._data_batch = self._data_batch, []
+
+        if batch:
+            try:
+                await self._copy(batch)
+            except Exception:
+                # Keep the batch so it is retried with the next flush
+                self._data_batch[:0] = batch
+                self._check_overflow()
+                raise
+
+        await self.flush_sketches()
+
+        # The database is reachable so replay any commands spilled during an outage
+        await self.replay_spill()
+
+    async def replay_spill(self):
+        if self._replaying:
+            return
+
+        self._replaying = True
+        try:
+            path = await self.bot.loop.run_in_executor(None, _claim_spill)
+            if path is None:
+                return
+
+            # Replay the whole file in one transaction so a failure can be retried without duplicates
+            async with MaybeAcquire() as connection:
+                async with connection.transaction():
+                    with open(path, encoding='UTF-8') as f:
+                        while True:
+                            records = await self.bot.loop.run_in_executor(None, _read_spill, f, _REPLAY_CHUNK)
+                            if not records:
+                                break
+                            await self._copy(records, connection=connection)
+
+            os.remove(path)
+        finally:
+            self._replaying = False
+
+    def _check_overflow(self):
+        # Spill the buffer to disk once it is full so an outage cannot exhaust memory
+        if len(self._data_batch) >= _MAX_BUFFERED and (self._spill_task is None or self._spill_task.done()):
+            batch, self._data_batch = self._data_batch, []
+            self._spill_task = self.bot.loop.run_in_executor(None, _write_spill, batch)
+            self._spill_task.add_done_callback(functools.partial(self._on_spilled, batch))
+
+    def _on_spilled(self, batch, future):
+        error = None if future.cancelled() else future.exception()
+        if error is None:
+            return
+
+        # Keep the batch to be flushed or spilled again, only dropping the oldest commands once far over the limit
+        self._data_batch[:0] = batch
+        dropped = max(len(self._data_batch) - 2 * _MAX_BUFFERED, 0)
+        del self._data_batch[:dropped]
+
+        self.bot.log.error(f'Failed to spill {len(batch)} commands to disk: {type(error).__name__}: {error}'
+                           f'{f", dropped the oldest {dropped}" if dropped else ""}')
+
+    async def _threshold_flush(self):
+        try:
+            await self.bulk_insert()
+        except (OSError, asyncpg.PostgresConnectionError):
+            pass
 
     async def register_command(self, ctx):
         if ctx.command is None:
@@ -68,9 +619,41 @@ class CommandStats(commands.Cog):
         command_name = ctx.command.qualified_name
         self.bot.command_stats[command_name] += 1
 
-        async with self._batch_lock:
-            self._data_batch.append((ctx.guild.id if ctx.guild is not None else None, ctx.channel.id, ctx.author.id,
-                                     ctx.message.created_at, ctx.prefix, command_name, ctx.command_failed))
+        # Commands already running when the extension was loaded are not timed
+        duration = getattr(ctx, '_command_duration', None)
+        if duration is not None:
+            self.bot.command_latencies[command_name].record(duration)
+
+        guild_id = ctx.guild.id if ctx.guild is not None else None
+        self._data_batch.append((guild_id, ctx.channel.id, ctx.author.id,
+                                 ctx.message.created_at, ctx.prefix, command_name, ctx.command_failed, duration))
+
+        # Invokes outside of a guild are counted under a guild_id of 0, as in the rollups
+        day = ctx.message.created_at.date()
+        for key in ((day, command_name, guild_id or 0), (day, command_name, None)):
+            if key not in self._sketches:
+                self._sketches[key] = HyperLogLog(_SKETCH_PRECISION)
+            self._sketches[key].add(ctx.author.id)
+            self._dirty_sketches.add(key)
+
+        for heavy_hitters in self._heavy_hitters['users'].values():
+            heavy_hitters.add(ctx.author.id)
+        if guild_id is not None:
+            for heavy_hitters in self._heavy_hitters['guilds'].values():
+                heavy_hitters.add(guild_id)
+        self._check_overflow()
+
+        # Flush early if the buffer has grown large, without waiting on the write
+        if len(self._data_batch) >= _FLUSH_THRESHOLD and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = self.bot.loop.create_task(self._threshold_flush())
+
+    async def _invoke(self, ctx):
+        # Listeners only run once the command first yields, so commands are timed around Bot.invoke
+        started_at = time.perf_counter()
+        try:
+            await type(self.bot).invoke(self.bot, ctx)
+        finally:
+            ctx._command_duration = time.perf_counter() - started_at
 
     @commands.Cog.listener()
     async def on_command_completion(self, ctx):
@@ -82,12 +665,172 @@ class CommandStats(commands.Cog):
 
     @tasks.loop(seconds=30.0)
     async def bulk_insert_loop(self):
-        async with self._batch_lock:
-            await self.bulk_insert()
+        await self.bulk_insert()
+
+    @bulk_insert_loop.before_loop
+    async def before_bulk_insert_loop(self):
+        await self.bot.wait_until_ready()
+
+        # Add columns introduced since the table was created
+        await _Commands.create()
+        await _HourlyCommands.create()
+        await _CommandUsers.create()
+        await _GlobalCommandUsers.create()
+        async with MaybeAcquire() as connection:
+            await connection.execute(f'ALTER TABLE {_Commands._name} ADD COLUMN IF NOT EXISTS duration DOUBLE PRECISION')
+
+            # Build the rollups from existing history while they are empty, blocking inserts meanwhile
+            async with connection.transaction():
+                await connection.execute(f'LOCK TABLE {_Commands._name} IN SHARE MODE')
+                if not await connection.fetchval(f'SELECT EXISTS (SELECT 1 FROM {_HourlyCommands._name})'):
+                    await connection.execute(_ROLLUP_RANGE, datetime.datetime.min, datetime.datetime.max)
+
+            await self.partition_commands(connection)
+            await connection.execute(_INDEXES)
+            await self.backfill_global_sketches(connection)
+
+            # Partitions must exist before the first flush, which would otherwise have nowhere to insert
+            await self.create_partitions(connection)
+
+        self.partition_loop.start()
+
+    async def backfill_global_sketches(self, connection):
+        """Builds the sketches across all guilds from the per guild sketches while they are empty."""
+        async with connection.transaction():
+            await connection.execute(f'LOCK TABLE {_GlobalCommandUsers._name} IN SHARE ROW EXCLUSIVE MODE')
+            if await connection.fetchval(f'SELECT EXISTS (SELECT 1 FROM {_GlobalCommandUsers._name})'):
+                return
+
+            # Merge a day's sketches at a time so only one day is held in memory
+            sketches, day = {}, None
+            async for record in connection.cursor(f'SELECT * FROM {_CommandUsers._name} ORDER BY day'):
+                if record['day'] != day:
+                    await _GLOBAL_SKETCHES.store(connection, sketches)
+                    sketches, day = {}, record['day']
+                key = (day, record['command'])
+                if key not in sketches:
+                    sketches[key] = HyperLogLog(_SKETCH_PRECISION)
+                sketches[key].merge(HyperLogLog.from_bytes(record['sketch']))
+            await _GLOBAL_SKETCHES.store(connection, sketches)
+
+    async def partition_commands(self, connection):
+        """Converts the commands table to be partitioned by month, keeping existing rows in a legacy partition."""
+        relkind = await connection.fetchval('SELECT relkind::text FROM pg_class WHERE oid = to_regclass($1)', _Commands._name)
+        if relkind != 'r':
+            return
+
+        this_month = _month(datetime.datetime.utcnow())
+        legacy = f'{_COMMANDS_TABLE}_legacy_p{this_month:%Y%m}'
+
+        async with connection.transaction():
+            await connection.execute(f'ALTER TABLE {_Commands._name} RENAME TO {legacy}')
+            await connection.execute(f"""
+                CREATE TABLE {_Commands._name} (LIKE {_Commands.schema}.{legacy} INCLUDING DEFAULTS)
+                PARTITION BY RANGE (used_at)
+            """)
+
+            # The id sequence must outlive the legacy partition
+            sequence = await connection.fetchval('SELECT pg_get_serial_sequence($1, \'id\')', f'{_Commands.schema}.{legacy}')
+            await connection.execute(f'ALTER SEQUENCE {sequence} OWNED BY {_Commands._name}.id')
+
+            if await connection.fetchval(f'SELECT EXISTS (SELECT 1 FROM {_Commands.schema}.{legacy})'):
+                await connection.execute(f"""
+                    ALTER TABLE {_Commands._name} ATTACH PARTITION {_Commands.schema}.{legacy}
+                    FOR VALUES FROM (MINVALUE) TO ('{_month(this_month, 1)}')
+                """)
+            else:
+                await connection.execute(f'DROP TABLE {_Commands.schema}.{legacy}')
+
+    async def _partitions(self, connection):
+        records = await connection.fetch("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass($1)
+        """, _Commands._name)
+
+        # Maps each partition's name to its bounds, legacy partitions have no lower bound
+        partitions = {}
+        for record in records:
+            match = _PARTITION_PATTERN.fullmatch(record['relname'])
+            if match is not None:
+                legacy, year, month = match.groups()
+                start = datetime.datetime(int(year), int(month), 1)
+                partitions[record['relname']] = (datetime.datetime.min if legacy else start, _month(start, 1))
+
+        return partitions
+
+    async def create_partitions(self, connection):
+        """Creates the default partition, and partitions for this month, next month and any month in the default partition.
+
+        Rows which fell through to the default partition are moved into the partition created for their month,
+        as a range partition cannot be attached while the default partition holds rows within its range.
+        """
+        default = f'{_Commands._name}_default'
+        this_month = _month(datetime.datetime.utcnow())
+
+        async with connection.transaction():
+            # Processes sharing the database create partitions one at a time
+            await connection.execute('SELECT pg_advisory_xact_lock(hashtext($1))', _Commands._name)
+            await connection.execute(f'CREATE TABLE IF NOT EXISTS {default} PARTITION OF {_Commands._name} DEFAULT')
+
+            partitions = await self._partitions(connection)
+            months = {this_month, _month(this_month, 1)}
+            months.update(await connection.fetchval(f"""
+                SELECT array_agg(DISTINCT date_trunc('month', used_at)) FROM {default} WHERE used_at IS NOT NULL
+            """) or ())
+
+            for start in sorted(months):
+                end = _month(start, 1)
+                if any(s < end and e > start for s, e in partitions.values()):
+                    continue
+
+                # Block inserts into the default partition until its rows for the month have been moved
+                partition = f'{_Commands._name}_p{start:%Y%m}'
+                await connection.execute(f'LOCK TABLE {default} IN EXCLUSIVE MODE')
+                await connection.execute(f'CREATE TABLE {partition} (LIKE {_Commands._name} INCLUDING DEFAULTS)')
+                await connection.execute(f"""
+                    WITH moved AS (DELETE FROM {default} WHERE used_at >= $1 AND used_at < $2 RETURNING *)
+                    INSERT INTO {partition} SELECT * FROM moved
+                """, start, end)
+                await connection.execute(f"""
+                    ALTER TABLE {_Commands._name} ATTACH PARTITION {partition} FOR VALUES FROM ('{start}') TO ('{end}')
+                """)
+                partitions[partition] = (start, end)
+
+    async def expire_partitions(self, connection):
+        """Downsamples partitions older than the retention period into the rollups, then drops them."""
+        partitions = await self._partitions(connection)
+        cutoff = _month(_month(datetime.datetime.utcnow()), -_RETENTION_MONTHS)
+
+        for name, (start, end) in partitions.items():
+            if end > cutoff:
+                continue
+
+            async with connection.transaction():
+                await connection.execute(f'DELETE FROM {_HourlyCommands._name} WHERE hour >= $1 AND hour < $2', start, end)
+                await connection.execute(_ROLLUP_RANGE, start, end)
+                await connection.execute(f'DROP TABLE {_Commands.schema}.{name}')
+                await connection.execute(f'DELETE FROM {_Commands._name} WHERE used_at >= $1 AND used_at < $2', start, end)
+
+    @tasks.loop(hours=6)
+    async def partition_loop(self):
+        try:
+            async with MaybeAcquire() as connection:
+                await self.create_partitions(connection)
+                await self.expire_partitions(connection)
+        except asyncpg.PostgresError as error:
+            # Partitions are maintained again on the next iteration
+            self.bot.log.error(f'Failed to maintain command partitions: {type(error).__name__}: {error}')
+
+    def cog_unload(self):
+        del self.bot.invoke
+        self.partition_loop.cancel()
 
 
 def setup(bot: commands.Bot):
     if not hasattr(bot, 'command_stats'):
         bot.command_stats = Counter()
 
+    if not hasattr(bot, 'command_latencies'):
+        bot.command_latencies = defaultdict(Histogram)
+
     bot.add_cog(CommandStats(bot))
@@ -0,0 +1,42 @@
+import os
+
+from discord.ext import commands
+
+from bot.utils import checks, gateway
+from bot.utils.recorder import GatewayRecorder
+
+from bot.config import config as BOT_CONFIG
+COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
+
+# Recordings contain every payload the bot receives, including message content
+_DIRECTORY = getattr(COG_CONFIG, 'DIRECTORY', 'recordings')
+_MAX_FILE_SIZE = getattr(COG_CONFIG, 'MAX_FILE_MB', 64) * 1024 * 1024
+_MAX_FILES = getattr(COG_CONFIG, 'MAX_FILES', 10)
+
+
+class GatewayRecording(commands.Cog):
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.recorder = GatewayRecorder(_DIRECTORY, max_file_size=_MAX_FILE_SIZE, max_files=_MAX_FILES)
+        self.recorder.start()
+
+        gateway.install()
+        gateway.recorder = self.recorder
+
+    def cog_unload(self):
+        gateway.recorder = None
+        gateway.uninstall()
+        self.recorder.stop()
+
+    @commands.command(name='gatewayrecorder', aliases=['gateway_recorder'], hidden=True)
+    @commands.check(checks.is_owner)
+    async def gatewayrecorder(self, ctx: commands.Context):
+        """Retrieves basic information about the gateway recording."""
+        size = os.path.getsize(self.recorder.path) if self.recorder.path and os.path.exists(self.recorder.path) else 0
+        await ctx.send(f'{self.recorder.recorded} payloads recorded, currently writing '
+                       f'`{self.recorder.path}` ({size / 1024 / 1024:.1f}MiB).')
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(GatewayRecording(bot))
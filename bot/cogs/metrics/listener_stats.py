@@ -0,0 +1,122 @@
+import time
+
+from discord.ext import commands
+
+from bot.utils import checks
+
+from bot.config import config as BOT_CONFIG
+COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
+
+# Milliseconds a listener may hold the event loop for in one step before a warning is logged
+_WARN_THRESHOLD = getattr(COG_CONFIG, 'WARN_THRESHOLD_MS', 100) / 1000
+
+
+class _ListenerTimings:
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class _Timed:
+    """Awaits a coroutine, timing only the steps spent running it on the event loop."""
+    __slots__ = ('_coro', '_on_step')
+
+    def __init__(self, coro, on_step):
+        self._coro = coro
+        self._on_step = on_step
+
+    def __await__(self):
+        send, throw = self._coro.send, self._coro.throw
+        value, error = None, None
+        while True:
+            started_at = time.perf_counter()
+            try:
+                yielded = send(value) if error is None else throw(error)
+            except StopIteration as e:
+                self._on_step(time.perf_counter() - started_at, True)
+                return e.value
+            except BaseException:
+                self._on_step(time.perf_counter() - started_at, True)
+                raise
+            self._on_step(time.perf_counter() - started_at, False)
+
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class ListenerStats(commands.Cog):
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._names = {}
+
+        # Listeners are timed by running each event through a timed wrapper
+        bot._run_event = self._run_event
+
+    def cog_unload(self):
+        del self.bot._run_event
+
+    def _name(self, coro):
+        try:
+            return self._names[coro]
+        except KeyError:
+            owner = getattr(coro, '__self__', None)
+            if isinstance(owner, commands.Cog):
+                name = owner.qualified_name
+            elif isinstance(owner, commands.Bot):
+                name = 'Bot'
+            else:
+                name = coro.__module__
+            self._names[coro] = name = f'{name}.{coro.__name__}'
+            return name
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        key = (self._name(coro), event_name)
+        timings = self.bot.listener_stats.get(key)
+        if timings is None:
+            timings = self.bot.listener_stats[key] = _ListenerTimings()
+
+        elapsed = 0.0
+
+        def on_step(step, done):
+            nonlocal elapsed
+            elapsed += step
+            if step > timings.max:
+                timings.max = step
+            if step > _WARN_THRESHOLD:
+                self.bot.log.warning(f'{key[0]} blocked the event loop for {step * 1000:.0f}ms handling {event_name}')
+            if done:
+                timings.calls += 1
+                timings.total += elapsed
+
+        await _Timed(type(self.bot)._run_event(self.bot, coro, event_name, *args, **kwargs), on_step)
+
+    @commands.command(name='listenerstats', aliases=['listener_stats'], hidden=True)
+    @commands.check(checks.is_owner)
+    async def listenerstats(self, ctx: commands.Context, limit: int = 10):
+        """Retrieves the listeners which have spent the most time on the event loop."""
+        if not self.bot.listener_stats:
+            return await ctx.send('No listeners have been called.')
+
+        slowest = sorted(self.bot.listener_stats.items(), key=lambda item: -item[1].total)[:limit]
+
+        paginator = commands.Paginator()
+        for (name, event_name), timings in slowest:
+            paginator.add_line(f'{name} ({event_name}): {timings.calls} calls, {timings.total * 1000:.0f}ms total, '
+                               f'{timings.total / timings.calls * 1000 if timings.calls else 0:.2f}ms avg, '
+                               f'{timings.max * 1000:.1f}ms max step')
+
+        for page in paginator.pages:
+            await ctx.send(page)
+
+
+def setup(bot: commands.Bot):
+    if not hasattr(bot, 'listener_stats'):
+        bot.listener_stats = {}
+
+    bot.add_cog(ListenerStats(bot))
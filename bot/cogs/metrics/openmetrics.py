@@ -0,0 +1,182 @@
+import re
+
+from aiohttp import web
+from discord.ext import commands
+from donphan import connection as donphan_connection
+
+import bot.timers as timers
+from bot.utils import gateway
+
+from bot.config import config as BOT_CONFIG
+COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
+
+_HOST = getattr(COG_CONFIG, 'HOST', '127.0.0.1')
+_PORT = getattr(COG_CONFIG, 'PORT', 9100)
+
+_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+_PREFIX = re.sub(r'\W', '_', BOT_CONFIG.APP_NAME.lower())
+
+# Upper bounds in seconds of the buckets histograms are exposed with
+_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+_BUCKET_LABELS = [repr(bound) for bound in _BUCKETS]
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class _Family:
+    """A metric family, which caches the encoded name and labels of each of its samples."""
+    __slots__ = ('name', 'labels', 'header', '_prefixes')
+
+    def __init__(self, name: str, type: str, help: str, labels: tuple = ()):
+        self.name = f'{_PREFIX}_{name}'
+        self.labels = labels
+        self.header = f'# TYPE {self.name} {type}\n# HELP {self.name} {help}\n'.encode()
+        self._prefixes = {}
+
+    def write(self, buffer: bytearray, value, values: tuple = (), suffix: str = '', le: str = None):
+        key = (suffix, values, le)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+            if le is not None:
+                labels.append(f'le="{le}"')
+            prefix = f'{self.name}{suffix}{{{",".join(labels)}}} ' if labels else f'{self.name}{suffix} '
+            prefix = self._prefixes[key] = prefix.encode()
+
+        buffer += prefix
+        buffer += b'%d\n' % value if type(value) is int else b'%r\n' % value
+
+    def write_histogram(self, buffer: bytearray, histogram, values: tuple = ()):
+        for le, count in zip(_BUCKET_LABELS, histogram.cumulative(_BUCKETS)):
+            self.write(buffer, count, values, '_bucket', le)
+        self.write(buffer, histogram.count, values, '_bucket', '+Inf')
+        self.write(buffer, histogram.count, values, '_count')
+        self.write(buffer, histogram.total, values, '_sum')
+
+
+_COMMANDS = _Family('commands', 'counter', 'Commands invoked.', ('command',))
+_COMMAND_DURATION = _Family('command_duration_seconds', 'histogram', 'Command invoke duration.', ('command',))
+_COMMAND_BUFFER = _Family('command_buffer_depth', 'gauge', 'Invoked commands waiting to be written.')
+_SOCKET_EVENTS = _Family('socket_events', 'counter', 'Gateway events received.', ('event',))
+_GATEWAY_BYTES = _Family('gateway_received_bytes', 'counter', 'Gateway payload bytes received.', ('event', 'encoding'))
+_GATEWAY_DECODE = _Family('gateway_decode_seconds', 'counter', 'Time spent decoding gateway payloads.', ('event',))
+_TIMER_CLAIMS = _Family('timer_claims', 'counter', 'Batches of timers claimed.')
+_TIMERS_CLAIMED = _Family('timers_claimed', 'counter', 'Timers claimed.')
+_TIMERS_PRELOADED = _Family('timers_preloaded', 'gauge', 'Timers held in memory awaiting dispatch.')
+_SHORT_TIMERS = _Family('short_timers', 'gauge', 'Short timers held in memory.')
+_TIMER_LATENESS = _Family('timer_lateness_seconds', 'histogram', 'Timer dispatch lateness.', ('event',))
+_LISTENER_CALLS = _Family('listener_calls', 'counter', 'Event listener calls.', ('listener', 'event'))
+_LISTENER_TIME = _Family('listener_seconds', 'counter', 'Time event listeners held the event loop.', ('listener', 'event'))
+_LOOP_LAG = _Family('event_loop_lag_seconds', 'histogram', 'Event loop scheduling lag.')
+_HELP_SESSIONS = _Family('help_sessions', 'gauge', 'Active paginated help sessions.')
+_POOL_CONNECTIONS = _Family('db_pool_connections', 'gauge', 'Database pool connections.', ('state',))
+
+
+class OpenMetrics(commands.Cog):
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._buffer = bytearray()
+        self._runner = None
+        self.bot.loop.create_task(self.start_server())
+
+    def cog_unload(self):
+        if self._runner is not None:
+            self.bot.loop.create_task(self._runner.cleanup())
+
+    async def start_server(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.metrics)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, _HOST, _PORT).start()
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        # The buffer is reused between scrapes so it is only ever grown
+        buffer = self._buffer
+        buffer.clear()
+        self.render(buffer)
+        return web.Response(body=bytes(buffer), headers={'Content-Type': _CONTENT_TYPE})
+
+    def render(self, buffer: bytearray):
+        """Writes the bot's current metrics to a buffer as OpenMetrics text."""
+        bot = self.bot
+
+        if hasattr(bot, 'command_stats'):
+            buffer += _COMMANDS.header
+            for command, count in bot.command_stats.items():
+                _COMMANDS.write(buffer, count, (command,), '_total')
+
+            buffer += _COMMAND_DURATION.header
+            for command, histogram in bot.command_latencies.items():
+                _COMMAND_DURATION.write_histogram(buffer, histogram, (command,))
+
+        command_stats = bot.get_cog('CommandStats')
+        if command_stats is not None:
+            buffer += _COMMAND_BUFFER.header
+            _COMMAND_BUFFER.write(buffer, len(command_stats._data_batch))
+
+        if hasattr(bot, 'socket_stats'):
+            buffer += _SOCKET_EVENTS.header
+            for event, count in bot.socket_stats.items():
+                _SOCKET_EVENTS.write(buffer, count, (event,), '_total')
+
+            buffer += _GATEWAY_BYTES.header
+            for event, payloads in gateway.stats.items():
+                _GATEWAY_BYTES.write(buffer, payloads.raw_bytes, (event, 'raw'), '_total')
+                _GATEWAY_BYTES.write(buffer, payloads.compressed_bytes, (event, 'compressed'), '_total')
+
+            buffer += _GATEWAY_DECODE.header
+            for event, payloads in gateway.stats.items():
+                _GATEWAY_DECODE.write(buffer, payloads.decode_time, (event,), '_total')
+
+        stats = timers.stats
+        buffer += _TIMER_CLAIMS.header
+        _TIMER_CLAIMS.write(buffer, stats.claims, (), '_total')
+        buffer += _TIMERS_CLAIMED.header
+        _TIMERS_CLAIMED.write(buffer, stats.claimed, (), '_total')
+        buffer += _TIMERS_PRELOADED.header
+        _TIMERS_PRELOADED.write(buffer, stats.preloaded)
+        buffer += _SHORT_TIMERS.header
+        _SHORT_TIMERS.write(buffer, stats.short_timers)
+        buffer += _TIMER_LATENESS.header
+        for event, histogram in stats.lateness.items():
+            _TIMER_LATENESS.write_histogram(buffer, histogram, (event,))
+
+        if hasattr(bot, 'listener_stats'):
+            buffer += _LISTENER_CALLS.header
+            for key, timings in bot.listener_stats.items():
+                _LISTENER_CALLS.write(buffer, timings.calls, key, '_total')
+            buffer += _LISTENER_TIME.header
+            for key, timings in bot.listener_stats.items():
+                _LISTENER_TIME.write(buffer, timings.total, key, '_total')
+
+        if hasattr(bot, 'loop_monitor'):
+            buffer += _LOOP_LAG.header
+            _LOOP_LAG.write_histogram(buffer, bot.loop_monitor.lag)
+
+        help_cog = bot.get_cog('Help')
+        if help_cog is not None:
+            buffer += _HELP_SESSIONS.header
+            _HELP_SESSIONS.write(buffer, len(help_cog.active_help))
+
+        pool = donphan_connection._pool
+        if pool is not None:
+            # asyncpg only exposes pool sizes publicly from 0.25
+            holders = pool._holders
+            in_use = sum(1 for holder in holders if holder._in_use is not None)
+            connected = sum(1 for holder in holders if holder._con is not None)
+
+            buffer += _POOL_CONNECTIONS.header
+            _POOL_CONNECTIONS.write(buffer, in_use, ('in_use',))
+            _POOL_CONNECTIONS.write(buffer, connected - in_use, ('idle',))
+            _POOL_CONNECTIONS.write(buffer, len(holders), ('max',))
+
+        buffer += b'# EOF\n'
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(OpenMetrics(bot))
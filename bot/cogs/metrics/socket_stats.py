@@ -1,35 +1,156 @@
-from collections import Counter
+import datetime
+import time
+
+from collections import Counter, defaultdict
+from typing import Optional
 
 # import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+import asyncpg
+from donphan import Column, MaybeAcquire, SQLType, Table
+
+from bot.utils import checks, converters, gateway
+from bot.utils.rolling import RollingCounter
 
 from bot.config import config as BOT_CONFIG
 COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
 
+# Windows in seconds which event rates are reported over
+_RATE_WINDOWS = {'1m': 60, '5m': 300, '15m': 900}
+
+
+class _SocketEvents(Table):
+    minute: SQLType.Timestamp = Column(primary_key=True)
+    event: str = Column(primary_key=True)
+    count: int
+
+
+_STORE_EVENTS = f"""
+INSERT INTO {_SocketEvents._name} (minute, event, count)
+    SELECT * FROM unnest($1::timestamp[], $2::text[], $3::integer[])
+ON CONFLICT (minute, event) DO UPDATE SET count = {_SocketEvents._name}.count + excluded.count
+"""
+
 
 class SocketStats(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-    @commands.command(name='socketstats', aliases=['socket_stats'], hidden=True)
+        # Dispatched events counted since the last flush, keyed by minute since the epoch and event type
+        self._event_batch = Counter()
+
+        self.bulk_insert_loop.add_exception_type(
+            asyncpg.PostgresConnectionError)
+        self.bulk_insert_loop.start()
+
+    @commands.group(name='socketstats', aliases=['socket_stats'], hidden=True, invoke_without_command=True)
     async def socketstats(self, ctx: commands.Context):
         """Retrieves basic information about socket statistics."""
         delta = ctx.message.created_at - self.bot._start_time
         minutes = delta.total_seconds() / 60
         total = sum(self.bot.socket_stats.values())
         cpm = total / minutes
-        socket_stats = "\n".join(
-            f"{name}: {count}" for name, count in self.bot.socket_stats.items())
-        await ctx.send(f'{total} socket events observed ({cpm:.2f}/minute):\n```\n{socket_stats}\n```')
+
+        paginator = commands.Paginator()
+        for name, count in self.bot.socket_stats.most_common():
+            rates = self.bot.socket_rates[name]
+            windows = ', '.join(f'{window} {rates.rate(seconds):.2f}/s' for window, seconds in _RATE_WINDOWS.items())
+            paginator.add_line(f'{name}: {count} ({windows}, peak {rates.peak(max(_RATE_WINDOWS.values()))}/s)')
+
+        # Payload throughput, largest first
+        seconds = delta.total_seconds()
+        paginator.add_line()
+        for name, payloads in sorted(gateway.stats.items(), key=lambda item: -item[1].raw_bytes):
+            paginator.add_line(f'{name}: {payloads.raw_bytes / seconds:.0f}B/s ({payloads.raw_rate.rate(60):.0f}B/s 1m), '
+                               f'{payloads.compressed_bytes / seconds:.0f}B/s compressed, '
+                               f'{payloads.average_decode_time * 1000000:.0f}us/decode')
+
+        await ctx.send(f'{total} socket events observed ({cpm:.2f}/minute):')
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @socketstats.command(name='history')
+    @commands.check(checks.is_owner)
+    async def socketstats_history(self, ctx: commands.Context, since: converters.Duration,
+                                  until: Optional[converters.Duration] = None):
+        """Retrieves socket event counts over a time range from the stored history.
+
+        Args:
+            since: How long ago the range starts, e.g. `1d`.
+            until: How long ago the range ends, defaults to now.
+        """
+        now = datetime.datetime.utcnow()
+        start, end = now - since, now - (until or datetime.timedelta())
+
+        async with MaybeAcquire() as connection:
+            records = await connection.fetch(f"""
+                SELECT event, SUM(count) AS total, MAX(count) AS peak
+                FROM {_SocketEvents._name}
+                WHERE minute >= date_trunc('minute', $1::timestamp) AND minute < $2
+                GROUP BY event
+                ORDER BY total DESC
+            """, start, end)
+
+        if not records:
+            return await ctx.send('No socket events were stored in that time range.')
+
+        minutes = (end - start).total_seconds() / 60
+        paginator = commands.Paginator()
+        for record in records:
+            paginator.add_line(f'{record["event"]}: {record["total"]} ({record["total"] / minutes:.2f}/minute, '
+                               f'peak {record["peak"]}/minute)')
+
+        await ctx.send(f'Socket events from {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} UTC:')
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    async def bulk_insert(self):
+        # Swap in an empty batch so events can be counted while the batch is written
+        batch, self._event_batch = self._event_batch, Counter()
+        if not batch:
+            return
+
+        try:
+            async with MaybeAcquire() as connection:
+                await connection.execute(_STORE_EVENTS, [datetime.datetime.utcfromtimestamp(m * 60) for m, _ in batch],
+                                         [event for _, event in batch], list(batch.values()))
+        except Exception:
+            # Keep the counts so they are retried with the next flush
+            self._event_batch.update(batch)
+            raise
 
     @commands.Cog.listener()
     async def on_socket_response(self, msg):
-        self.bot.socket_stats[msg.get('t')] += 1
+        event_type = msg.get('t')
+        self.bot.socket_stats[event_type] += 1
+        self.bot.socket_rates[event_type].increment()
+
+        # Only dispatched events are stored, other payloads have no event type
+        if event_type is not None:
+            self._event_batch[int(time.time() // 60), event_type] += 1
+
+    @tasks.loop(seconds=60.0)
+    async def bulk_insert_loop(self):
+        await self.bulk_insert()
+
+    @bulk_insert_loop.before_loop
+    async def before_bulk_insert_loop(self):
+        await self.bot.wait_until_ready()
+        await _SocketEvents.create()
 
 
 def setup(bot: commands.Bot):
     if not hasattr(bot, 'socket_stats'):
         bot.socket_stats = Counter()
 
+    if not hasattr(bot, 'socket_rates'):
+        bot.socket_rates = defaultdict(lambda: RollingCounter(max(_RATE_WINDOWS.values())))
+
     bot.add_cog(SocketStats(bot))
+    gateway.install()
+
+
+def teardown(bot: commands.Bot):
+    gateway.uninstall()
@@ -0,0 +1,36 @@
+from discord.ext import commands
+
+import bot.timers as timers
+from bot.utils import checks
+
+from bot.config import config as BOT_CONFIG
+COG_CONFIG = BOT_CONFIG.EXTENSIONS[__name__]
+
+
+class TimerStats(commands.Cog):
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.command(name='timerstats', aliases=['timer_stats'], hidden=True)
+    @commands.check(checks.is_owner)
+    async def timerstats(self, ctx: commands.Context):
+        """Retrieves basic information about timer dispatch statistics."""
+        stats = timers.stats
+        overdue = await timers.count_overdue_timers()
+
+        lateness = []
+        for event_type, histogram in sorted(stats.lateness.items()):
+            p50, p95, p99 = histogram.percentiles(50, 95, 99)
+            lateness.append(f'{event_type}: {histogram.count} dispatched, p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, '
+                            f'p99 {p99 * 1000:.0f}ms, max {histogram.max * 1000:.0f}ms')
+        lateness = '\n'.join(lateness) or 'No timers dispatched.'
+
+        await ctx.send(f'{stats.claimed} timers claimed in {stats.claims} batches '
+                       f'({stats.average_batch_size:.1f}/batch, {stats.average_claim_latency * 1000:.2f}ms/claim).\n'
+                       f'{overdue} overdue, {stats.preloaded} preloaded, {stats.short_timers} short timers in memory.\n'
+                       f'Dispatch lateness:\n```\n{lateness}\n```')
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(TimerStats(bot))
@@ -0,0 +1,230 @@
+"""
+Replays recorded gateway traffic into an offline bot instance.
+
+Recordings are made by the `bot.cogs.metrics.gateway_recorder` extension.
+
+    python -m bot.replay recordings/gateway-*.rec.gz --speed 10
+
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import logging
+import time
+import zlib
+
+import discord
+from discord import gateway
+from discord.ext import commands
+
+import bot.config as config
+import bot.timers as timers
+from bot.utils.recorder import read_recording
+
+from bot.config import config as BOT_CONFIG
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Extensions which need the network, and are not loaded unless requested
+_ONLINE_EXTENSIONS = {'bot.cogs.metrics.gateway_recorder', 'bot.cogs.metrics.openmetrics'}
+_LISTENER_STATS = 'bot.cogs.metrics.listener_stats'
+
+
+class Offline(discord.DiscordException):
+    """Raised in place of any HTTP request made during a replay."""
+
+
+def _memory() -> int:
+    # Prefer the current resident set size, falling back to its peak
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def create_bot(loop: asyncio.AbstractEventLoop, extensions: list) -> commands.Bot:
+    """Creates a bot instance which cannot reach Discord or the database.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The event loop to run the bot on.
+        extensions (list): The extensions to load.
+
+    Returns:
+        commands.Bot: The bot, with a `replay_errors` Counter of errors raised by listeners and commands.
+    """
+    config._bot = timers._bot = bot = commands.Bot(
+        command_prefix=commands.when_mentioned_or(*BOT_CONFIG.PREFIXES),
+        case_insensitive=True,
+        fetch_offline_members=False,
+        loop=loop
+    )
+
+    bot.__version__ = BOT_CONFIG.VERSION
+    bot._start_time = datetime.datetime.utcnow()
+    bot.dm_help = False
+    bot.log = logging.getLogger(__name__)
+
+    async def request(*args, **kwargs):
+        raise Offline('HTTP requests are unavailable during a replay.')
+
+    bot.http.request = request
+
+    # Recordings started after connecting have no READY payload to set the bot's user
+    bot._connection.user = discord.ClientUser(state=bot._connection, data={
+        'id': 0, 'username': BOT_CONFIG.APP_NAME, 'discriminator': '0000', 'avatar': None, 'bot': True
+    })
+
+    # Database backed loops wait for the bot to be ready, so hold them forever
+    never = loop.create_future()
+
+    async def wait_until_ready():
+        await asyncio.shield(never)
+
+    bot.wait_until_ready = wait_until_ready
+
+    # Count errors rather than reporting them
+    bot.replay_errors = collections.Counter()
+
+    async def on_error(event_method, *args, **kwargs):
+        bot.replay_errors[event_method] += 1
+
+    async def on_command_error(ctx, error):
+        bot.replay_errors['on_command_error'] += 1
+
+    bot.on_error = on_error
+    bot.on_command_error = on_command_error
+
+    # Listener timings are always collected
+    BOT_CONFIG.EXTENSIONS.setdefault(_LISTENER_STATS, None)
+    bot.load_extension('bot.help')
+    for extension in dict.fromkeys([*extensions, _LISTENER_STATS]):
+        bot.load_extension(extension)
+
+    return bot
+
+
+def create_websocket(bot: commands.Bot) -> gateway.DiscordWebSocket:
+    """Creates a gateway connection which only handles payloads passed to it by `received_message`."""
+    ws = gateway.DiscordWebSocket.__new__(gateway.DiscordWebSocket)
+    ws._dispatch = bot.dispatch
+    ws._dispatch_listeners = []
+    ws._connection = bot._connection
+    ws._discord_parsers = bot._connection.parsers
+    ws._zlib = zlib.decompressobj()
+    ws._buffer = bytearray()
+    ws.shard_id = None
+    ws.session_id = None
+    ws.sequence = None
+
+    # StreamReaderProtocol.__del__ expects the future its constructor would have created
+    ws._closed = bot.loop.create_future()
+    return ws
+
+
+async def _idle(loop: asyncio.AbstractEventLoop, timeout: float):
+    # Waits for the listener tasks spawned by the replay to finish
+    current = asyncio.current_task(loop=loop)
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        pending = [task for task in asyncio.all_tasks(loop=loop) if task is not current and not task.done()]
+        if all(not isinstance(task, discord.client._ClientEventTask) for task in pending):
+            return
+        await asyncio.sleep(0.01)
+
+
+async def replay(bot: commands.Bot, paths: list, speed: float = None, drain_timeout: float = 30.0) -> dict:
+    """Feeds recorded dispatch payloads to a bot.
+
+    Args:
+        bot (commands.Bot): The bot to replay to, see :func:`create_bot`.
+        paths (list): The recording files to replay, in order.
+        speed (float, optional): How many times faster than recorded to replay,
+            or as fast as possible if `None`.
+        drain_timeout (float, optional): Seconds to wait for listeners to finish after the last payload.
+
+    Returns:
+        dict: The number of events replayed, the seconds taken and the memory used before and after.
+    """
+    ws = create_websocket(bot)
+    loop = bot.loop
+
+    memory_before = _memory()
+    started_at = time.perf_counter()
+    first = None
+    events = 0
+
+    for timestamp, op, payload in read_recording(paths):
+        # Only dispatches are replayed, other opcodes drive the connection itself
+        if op != ws.DISPATCH:
+            continue
+
+        if speed is not None:
+            first = timestamp if first is None else first
+            delay = (timestamp - first) / speed - (time.perf_counter() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        await ws.received_message(payload)
+        events += 1
+
+        # Let listeners run between payloads when replaying as fast as possible
+        if speed is None and events % 100 == 0:
+            await asyncio.sleep(0)
+
+    await _idle(loop, drain_timeout)
+
+    return {
+        'events': events,
+        'seconds': time.perf_counter() - started_at,
+        'memory_before': memory_before,
+        'memory_after': _memory(),
+    }
+
+
+def _report(bot: commands.Bot, result: dict, limit: int = 20):
+    seconds = result['seconds']
+    print(f'{result["events"]} events replayed in {seconds:.2f}s ({result["events"] / seconds:.0f} events/s)')
+    print(f'Memory: {result["memory_before"] / 1024 / 1024:.1f}MiB -> {result["memory_after"] / 1024 / 1024:.1f}MiB '
+          f'({(result["memory_after"] - result["memory_before"]) / 1024 / 1024:+.1f}MiB)')
+    print(f'Cache: {len(bot.guilds)} guilds, {len(bot.users)} users, {len(bot.cached_messages)} messages')
+
+    print('\nListeners by event loop time:')
+    slowest = sorted(bot.listener_stats.items(), key=lambda item: -item[1].total)[:limit]
+    for (name, event_name), timings in slowest:
+        print(f'  {name} ({event_name}): {timings.calls} calls, {timings.total * 1000:.0f}ms total, '
+              f'{timings.total / timings.calls * 1000000 if timings.calls else 0:.0f}us avg, '
+              f'{timings.max * 1000:.1f}ms max step')
+
+    if bot.replay_errors:
+        print('\nErrors raised:')
+        for event_method, count in bot.replay_errors.most_common():
+            print(f'  {event_method}: {count}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays recorded gateway traffic into an offline bot instance.')
+    parser.add_argument('paths', nargs='+', help='Recording files to replay, in order.')
+    parser.add_argument('--speed', default='max', help='1, 10 or any other multiple of real time, or max.')
+    parser.add_argument('--extension', '-e', action='append', dest='extensions',
+                        help='An extension to load, defaults to those in config.yml which work offline.')
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    extensions = args.extensions or [e for e in BOT_CONFIG.EXTENSIONS if e not in _ONLINE_EXTENSIONS]
+
+    loop = asyncio.get_event_loop()
+    bot = create_bot(loop, extensions)
+    result = loop.run_until_complete(replay(bot, sorted(args.paths), speed))
+    _report(bot, result)
+
+
+if __name__ == '__main__':
+    main()
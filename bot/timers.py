@@ -1,23 +1,133 @@
 import asyncio
 import datetime
+import heapq
+import itertools
+import json
+import math
+import time
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
 
 import discord
 
 import asyncpg
 from donphan import Column, MaybeAcquire, Table
 
+from bot.utils.histogram import Histogram
+
 _active_timer = None
 _bot = None
 
+# How far ahead the dispatcher preloads timers into memory
+_WINDOW = datetime.timedelta(hours=1)
+# Maximum number of timers preloaded in a single window
+_WINDOW_LIMIT = 1000
+
+# Min-heap of (expires_at, id) for preloaded timers, entries not in _scheduled are stale
+_heap = []
+_scheduled = {}
+# Every stored timer expiring before this point is in the heap
+_window_end = None
+# Earliest insert notified while a window is being loaded, which the load may not have seen
+_loading = False
+_notified_during_load = None
+
+# Maximum number of due timers claimed in a single statement
+_CLAIM_LIMIT = 1000
+
+# Timers expiring further ahead than this are kept in the cold table
+_HOT_HORIZON = datetime.timedelta(days=1)
+# How often cold timers which are now due soon are moved into the hot table
+_MIGRATE_INTERVAL = datetime.timedelta(hours=1)
+_migrate_at = None
+
+# Channel timer inserts and deletions are announced on
+_NOTIFY_CHANNEL = '_timers'
+
+# Timers expiring within this many seconds are kept in memory only
+_SHORT_TIMER_SECONDS = 60
+
+# Short timers are given negative IDs so they never clash with stored timers
+_short_timer_ids = itertools.count(-1, -1)
+
+# Channel recurring timer inserts and deletions are announced on
+_RECURRING_NOTIFY_CHANNEL = '_recurringtimers'
+# How often a process which does not dispatch recurring timers checks whether it should take over
+_RECURRING_LEADER_RETRY = datetime.timedelta(minutes=1)
+
+# Min-heap of (expires_at, id) for the next occurrence of each recurring timer
+_recurring_heap = []
+_recurring = {}
+# Whether this process holds the lock to dispatch recurring timers
+_recurring_leader = False
+_recurring_leader_retry_at = None
+_reload_recurring = True
+
 
 class _Timers(Table):
     id: int = Column(primary_key=True, auto_increment=True)
     created_at: datetime.datetime = Column(nullable=False, default='NOW()')
-    expires_at: datetime.datetime = Column(nullable=False, index=True)
+    expires_at: datetime.datetime = Column(nullable=False)
     event_type: str = Column(nullable=False)
     data: dict = Column(nullable=False, default={})
 
 
+_NOTIFY_TRIGGER = '''
+CREATE OR REPLACE FUNCTION {table}_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{channel}', json_build_object(
+        'op', lower(TG_OP),
+        'expires_at', extract(epoch FROM min(expires_at)),
+        'ids', CASE WHEN count(*) <= 100 THEN array_agg(id) END
+    )::text) FROM changed HAVING count(*) > 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = '{table}'::regclass AND tgname = '{name}_insert_notify') THEN
+        CREATE TRIGGER {name}_insert_notify AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE PROCEDURE {table}_notify();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = '{table}'::regclass AND tgname = '{name}_delete_notify') THEN
+        CREATE TRIGGER {name}_delete_notify AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS changed FOR EACH STATEMENT EXECUTE PROCEDURE {table}_notify();
+    END IF;
+END;
+$$;
+'''
+
+
+class _ColdTimers(Table):
+    # IDs are taken from _Timers' sequence so timers keep their ID when moved
+    id: int = Column(primary_key=True)
+    created_at: datetime.datetime = Column(nullable=False, default='NOW()')
+    expires_at: datetime.datetime = Column(nullable=False)
+    event_type: str = Column(nullable=False)
+    data: dict = Column(nullable=False, default={})
+
+
+class _RecurringTimers(Table):
+    id: int = Column(primary_key=True, auto_increment=True)
+    created_at: datetime.datetime = Column(nullable=False, default='NOW()')
+    expires_at: datetime.datetime = Column(nullable=False)
+    interval: datetime.timedelta = Column(nullable=False)
+    event_type: str = Column(nullable=False)
+    data: dict = Column(nullable=False, default={})
+
+
+_KWARGS_INDEX = '''
+CREATE INDEX IF NOT EXISTS {name}_kwargs_idx ON {table} USING gin ((data -> 'kwargs') jsonb_path_ops);
+'''
+
+# Due timers are claimed, loaded and migrated by expiry, donphan does not create column indexes itself
+_EXPIRES_AT_INDEX = '''
+CREATE INDEX IF NOT EXISTS {name}_expires_at_idx ON {table} (expires_at);
+'''
+
+
 class Timer:
     __slots__ = ('id', 'created_at', 'expires_at',
                  'event_type', 'args', 'kwargs')
@@ -57,65 +167,506 @@ class Timer:
         return f'<Timer id={self.id} created_at={self.created_at} expires_at={self.expires_at} event_type={self.event_type}>'
 
 
-async def get_active_timer(connection=None, days=7) -> Timer:
-    # Fetch upcoming timer from database
-    record = await _Timers.fetchrow_where(
-        'expires_at < (CURRENT_DATE + $1::interval) ORDER BY expires_at LIMIT 1', (datetime.timedelta(days=days),), connection=connection)
-    return Timer(record) if record else None
+class RecurringTimer(Timer):
+    """A timer which fires repeatedly at a fixed interval.
 
+    The timer's `expires_at` is its next occurrence.
+    """
+    __slots__ = ('starts_at', 'interval')
 
-async def _wait_for_active_timers(connection=None, days=7) -> Timer:
-    async with MaybeAcquire(connection=connection) as connection:
+    def __init__(self, record):
+        super().__init__(record)
+        self.starts_at = record['expires_at']
+        self.interval = record['interval']
 
-        # check database for active timer
-        timer = await get_active_timer(connection=connection, days=days)
+    def next_occurrence(self, after: datetime.datetime) -> datetime.datetime:
+        """Returns the first occurrence of the timer at or after a given time."""
+        if after <= self.starts_at:
+            return self.starts_at
+        return self.starts_at + -((self.starts_at - after) // self.interval) * self.interval
 
-        # if timer was found return it
-        if timer is not None:
-            _bot._active_timer.set()
-            return timer
+    def __repr__(self):
+        return f'<RecurringTimer id={self.id} expires_at={self.expires_at} interval={self.interval} event_type={self.event_type}>'
+
+
+class TimerStats:
+    """Metrics on timers dispatched by this process.
+
+    Attributes:
+        claims (int): The number of claim statements executed.
+        claimed (int): The total number of timers claimed.
+        last_batch_size (int): The number of timers claimed by the last claim.
+        max_batch_size (int): The largest number of timers claimed at once.
+        last_claim_latency (float): How long the last claim took in seconds.
+        total_claim_latency (float): How long all claims took in seconds.
+        lateness (dict): Histograms of how many seconds late timers were
+            dispatched, by event type.
+    """
+    __slots__ = ('claims', 'claimed', 'last_batch_size', 'max_batch_size',
+                 'last_claim_latency', 'total_claim_latency', 'lateness')
+
+    def __init__(self):
+        self.claims = 0
+        self.claimed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_claim_latency = 0.0
+        self.total_claim_latency = 0.0
+        self.lateness = defaultdict(Histogram)
+
+    def record_claim(self, batch_size: int, latency: float):
+        self.claims += 1
+        self.claimed += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.last_claim_latency = latency
+        self.total_claim_latency += latency
+
+    def record_dispatch(self, timer: 'Timer', now: datetime.datetime):
+        self.lateness[timer.event_type].record((now - timer.expires_at).total_seconds())
+
+    @property
+    def preloaded(self) -> int:
+        """The number of stored timers preloaded into the dispatcher's heap."""
+        return len(_scheduled)
+
+    @property
+    def short_timers(self) -> int:
+        """The number of short timers held in memory."""
+        return len(_wheel)
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.claimed / self.claims if self.claims else 0.0
+
+    @property
+    def average_claim_latency(self) -> float:
+        return self.total_claim_latency / self.claims if self.claims else 0.0
+
+    def __repr__(self):
+        return f'<TimerStats claims={self.claims} claimed={self.claimed} average_claim_latency={self.average_claim_latency:.4f}>'
+
+
+stats = TimerStats()
+
+
+class _TimingWheel:
+    """A hashed timing wheel for timers kept in memory.
+
+    Timers are bucketed into slots by the tick they expire on, a single
+    ticker task advances through the slots dispatching each due timer.
+    Scheduling and cancelling a timer are both O(1).
+
+    Args:
+        callback (callable): Called with each timer as it expires.
+        tick (float, optional): The wheel's resolution in seconds.
+        size (int, optional): The number of slots in the wheel.
+    """
 
-        # otherwise wait for active timer
-        _bot._active_timer.clear()
-        _bot._current_timer = None
-        await _bot._active_timer.wait()
-        return await get_active_timer(connection=connection, days=days)
+    def __init__(self, callback, *, tick: float = 0.1, size: int = 1024):
+        self._callback = callback
+        self._tick = tick
+        self._slots = [dict() for _ in range(size)]
+        self._slot_of = {}
+        self._origin = None
+        self._current = 0
+        self._task = None
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, timer_id):
+        return timer_id in self._slot_of
+
+    def schedule(self, delay: float, timer: Timer):
+        loop = _bot.loop
+        if self._origin is None:
+            self._origin = loop.time()
+            self._current = 0
+
+        # Timers are never placed in a slot which has already been passed
+        deadline = max(math.ceil((loop.time() + delay - self._origin) / self._tick), self._current + 1)
+        index = deadline % len(self._slots)
+        self._slots[index][timer.id] = (deadline, timer)
+        self._slot_of[timer.id] = index
+
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+
+    def timers(self):
+        for timer_id, index in self._slot_of.items():
+            yield self._slots[index][timer_id][1]
+
+    def cancel(self, timer_id: int) -> Timer:
+        index = self._slot_of.pop(timer_id, None)
+        if index is None:
+            return None
+        return self._slots[index].pop(timer_id)[1]
+
+    def _advance(self, target: int):
+        # Each slot only needs visiting once however far the wheel has to turn
+        for tick in range(self._current + 1, min(target, self._current + len(self._slots)) + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for timer_id, (deadline, timer) in list(slot.items()):
+                if deadline <= target:
+                    del slot[timer_id]
+                    del self._slot_of[timer_id]
+                    self._callback(timer)
+        self._current = target
+
+    async def _run(self):
+        loop = _bot.loop
+        try:
+            while self._slot_of:
+                self._advance(int((loop.time() - self._origin) / self._tick))
+                await asyncio.sleep(self._origin + (self._current + 1) * self._tick - loop.time())
+        finally:
+            self._task = None
+            self._origin = None
 
 
-def _dispatch_timer_event(timer: Timer):
+def _dispatch_timer_event(timer: Timer, now: datetime.datetime = None):
+    stats.record_dispatch(timer, now or datetime.datetime.utcnow())
     event_name = f'{timer.event_type}_timer_complete'
     _bot.dispatch(event_name, *timer.args, **timer.kwargs)
 
 
-async def _call_timer(timer: Timer):
-    # delete timer from database
-    await _Timers.delete_where('id = $1', (timer.id,))
-    _dispatch_timer_event(timer)
+_wheel = _TimingWheel(_dispatch_timer_event)
 
 
-async def _call_short_timer(seconds: int, timer: Timer):
-    await asyncio.sleep(seconds)
-    _dispatch_timer_event(timer)
+def _schedule_short_timer(delay: float, timer: Timer):
+    timer.id = next(_short_timer_ids)
+    _wheel.schedule(delay, timer)
 
 
-async def _dispatch_timers():
+async def count_overdue_timers(connection=None) -> int:
+    """Returns the number of stored timers which have expired but not yet been dispatched.
+
+    Args:
+        connection (asyncpg.Connection, optional): A database connection to use.
+            If none is supplied a connection will be acquired from the pool.
+    """
+    async with MaybeAcquire(connection) as connection:
+        return await connection.fetchval(
+            f'SELECT COUNT(*) FROM {_Timers._name} WHERE expires_at < $1', datetime.datetime.utcnow())
+
+
+async def get_active_timer(connection=None, days=7) -> Timer:
+    # Fetch upcoming timer from database, far future timers are held in the cold table
+    async with MaybeAcquire(connection) as connection:
+        record = await connection.fetchrow(f'''
+            SELECT * FROM (
+                (SELECT * FROM {_Timers._name} WHERE expires_at < (CURRENT_DATE + $1::interval) ORDER BY expires_at LIMIT 1)
+                UNION ALL
+                (SELECT * FROM {_ColdTimers._name} WHERE expires_at < (CURRENT_DATE + $1::interval) ORDER BY expires_at LIMIT 1)
+            ) AS timers ORDER BY expires_at LIMIT 1
+        ''', datetime.timedelta(days=days))
+    return Timer(record) if record else None
+
+
+def _schedule(timer: Timer) -> bool:
+    # Skip timers which have already been preloaded
+    if timer.id in _scheduled:
+        return False
+
+    _scheduled[timer.id] = timer
+    heapq.heappush(_heap, (timer.expires_at, timer.id))
+    return True
+
+
+def _unschedule(timer_id: int) -> Timer:
+    timer = _scheduled.pop(timer_id, None)
+
+    # If the head timer was removed wake the dispatcher so it can reschedule
+    if timer is not None and timer == _bot._current_timer:
+        _bot._active_timer.set()
+
+    return timer
+
+
+def _peek() -> Timer:
+    # Discard stale entries for timers which were removed
+    while _heap and _heap[0][1] not in _scheduled:
+        heapq.heappop(_heap)
+
+    return _scheduled[_heap[0][1]] if _heap else None
+
+
+def _pop_due(now: datetime.datetime) -> list:
+    due = []
+    timer = _peek()
+    while timer is not None and timer.expires_at <= now:
+        heapq.heappop(_heap)
+        due.append(_scheduled.pop(timer.id))
+        timer = _peek()
+    return due
+
 
-    # Ensure timers table exists.
-    await _Timers.create()
+async def _load_timers(connection=None):
+    global _window_end, _loading, _notified_during_load
 
+    # Fetch upcoming timers from the database, inserts committed after the fetch's snapshot are noted as they are notified
+    end = datetime.datetime.utcnow() + _WINDOW
+    _loading, _notified_during_load = True, None
     try:
-        while not _bot.is_closed():
-            # fetch next timer from database
-            timer = _bot._current_timer = await _wait_for_active_timers(days=40)
-            now = datetime.datetime.utcnow()
+        records = await _Timers.fetch_where('expires_at < $1', end, connection=connection,
+                                            order_by='expires_at, id', limit=_WINDOW_LIMIT)
+    finally:
+        _loading = False
+
+    # The window must end before any timer the fetch may have missed
+    if _notified_during_load is not None:
+        end = min(end, _notified_during_load)
+
+    # If the window was truncated it only covers up until the last timer fetched
+    if len(records) == _WINDOW_LIMIT:
+        end = records[-1]['expires_at']
+
+    for record in records:
+        _schedule(Timer(record))
+
+    # Drop stale entries left behind by removed timers
+    if len(_heap) > 2 * len(_scheduled):
+        _heap[:] = [(timer.expires_at, timer.id) for timer in _scheduled.values()]
+        heapq.heapify(_heap)
+
+    _window_end = end
+
+
+def _preload(timers: Iterable[Timer]):
+    # Only preload timers which fall within the dispatch window
+    end = datetime.datetime.utcnow() + _WINDOW
+    earliest = None
+    for timer in timers:
+        if timer.expires_at < end and _schedule(timer):
+            if earliest is None or timer.expires_at < earliest:
+                earliest = timer.expires_at
+
+    # Wake the dispatcher if a timer is earlier than the currently set timer
+    if earliest is not None:
+        if _bot._current_timer is None or earliest < _bot._current_timer.expires_at:
+            _bot._active_timer.set()
+
+
+def _on_notification(connection, pid, channel, payload):
+    global _window_end, _notified_during_load
+    payload = json.loads(payload)
+    ids = payload['ids']
+
+    # Drop deleted timers from the heap
+    if payload['op'] == 'delete':
+        for timer_id in ids or ():
+            _unschedule(timer_id)
+        return
+
+    # Ignore inserts which are already in the heap
+    if ids is not None and all(timer_id in _scheduled for timer_id in ids):
+        return
+
+    # Shrink the window to the new timers so they are loaded once due
+    expires_at = datetime.datetime.utcfromtimestamp(payload['expires_at'])
+    if _loading:
+        if _notified_during_load is None or expires_at < _notified_during_load:
+            _notified_during_load = expires_at
+    elif _window_end is not None and expires_at < _window_end:
+        _window_end = expires_at
+        _bot._active_timer.set()
+
+
+def _on_recurring_notification(connection, pid, channel, payload):
+    global _reload_recurring
+
+    # Recurring timers are few so the dispatching process simply reloads them
+    if _recurring_leader:
+        _reload_recurring = True
+        _bot._active_timer.set()
+
+
+async def _load_recurring_timers(connection: asyncpg.Connection):
+    global _recurring_leader, _recurring_leader_retry_at, _reload_recurring
+    now = datetime.datetime.utcnow()
+
+    # Only the process holding the advisory lock dispatches recurring timers,
+    # the lock is held by the listener connection so it is released if the process dies
+    if not _recurring_leader:
+        _recurring_leader = await connection.fetchval('SELECT pg_try_advisory_lock(hashtext($1))', _RecurringTimers._name)
+        _recurring_leader_retry_at = now + _RECURRING_LEADER_RETRY
+        if not _recurring_leader:
+            return
+
+    _reload_recurring = False
+    records = await _RecurringTimers.fetchall(connection=connection)
+
+    # Timers which were already loaded keep their pending occurrence
+    timers = {}
+    for record in records:
+        timer = _recurring.get(record['id']) or RecurringTimer(record)
+        if timer.id not in _recurring:
+            timer.expires_at = timer.next_occurrence(now)
+        timers[timer.id] = timer
+
+    _recurring.clear()
+    _recurring.update(timers)
+    _recurring_heap[:] = [(timer.expires_at, timer.id) for timer in timers.values()]
+    heapq.heapify(_recurring_heap)
+
+
+def _call_recurring_timers(now: datetime.datetime):
+    while _recurring_heap and _recurring_heap[0][0] <= now:
+        _, timer_id = heapq.heappop(_recurring_heap)
+        timer = _recurring.get(timer_id)
+        if timer is None:
+            continue
+
+        # Schedule the next occurrence in memory, occurrences missed entirely are skipped
+        _dispatch_timer_event(timer, now)
+        timer.expires_at = timer.next_occurrence(max(now, timer.expires_at + timer.interval))
+        heapq.heappush(_recurring_heap, (timer.expires_at, timer.id))
+
+
+async def _migrate_cold_timers(connection=None) -> int:
+    # Move cold timers which are now due soon into the hot table,
+    # rows being moved by another process are skipped
+    query = f'''WITH moved AS (
+        DELETE FROM {_ColdTimers._name} WHERE id IN (
+            SELECT id FROM {_ColdTimers._name} WHERE expires_at < $1 FOR UPDATE SKIP LOCKED
+        ) RETURNING *
+    ) INSERT INTO {_Timers._name} (id, created_at, expires_at, event_type, data)
+    SELECT id, created_at, expires_at, event_type, data FROM moved'''
+
+    async with MaybeAcquire(connection) as connection:
+        status = await connection.execute(query, datetime.datetime.utcnow() + _HOT_HORIZON)
+    return int(status.rpartition(' ')[2])
+
+
+async def _wait_until(when: datetime.datetime):
+    # Sleep until the deadline or until woken by a new or removed timer
+    _bot._active_timer.clear()
+    timeout = (when - datetime.datetime.utcnow()).total_seconds()
+    try:
+        await asyncio.wait_for(_bot._active_timer.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _claim_timers(now: datetime.datetime, connection=None) -> list:
+    # Remove a batch of due timers from the database returning the removed rows,
+    # rows locked by another process's claim are skipped so each timer is only claimed once
+    query = f'''DELETE FROM {_Timers._name} WHERE id IN (
+        SELECT id FROM {_Timers._name} WHERE expires_at <= $1 ORDER BY expires_at LIMIT $2 FOR UPDATE SKIP LOCKED
+    ) RETURNING *'''
+
+    start = time.perf_counter()
+    async with MaybeAcquire(connection) as connection:
+        records = await connection.fetch(query, now, _CLAIM_LIMIT)
+    stats.record_claim(len(records), time.perf_counter() - start)
+
+    return sorted((Timer(record) for record in records), key=lambda timer: (timer.expires_at, timer.id))
 
-            # if timer has not expired yet sleep
-            if timer.expires_at >= now:
-                to_sleep = (timer.expires_at - now).total_seconds()
-                await asyncio.sleep(to_sleep)
 
-            # dispatch the event
-            await _call_timer(timer)
+async def _call_timers(now: datetime.datetime):
+    # claim due timers from the database until none remain
+    while True:
+        timers = await _claim_timers(now)
+        dispatched_at = datetime.datetime.utcnow()
+
+        for timer in timers:
+            _scheduled.pop(timer.id, None)
+            _dispatch_timer_event(timer, dispatched_at)
+
+        if len(timers) < _CLAIM_LIMIT:
+            break
+
+    # drop any due timers which were removed before they could be claimed
+    _pop_due(now)
+
+
+async def _run_dispatcher(listener: asyncpg.Connection):
+    global _migrate_at
+
+    while not _bot.is_closed():
+        now = datetime.datetime.utcnow()
+
+        # slide the window forward once it has been exhausted
+        if _window_end is None or now >= _window_end:
+            if listener.is_closed():
+                raise ConnectionError('Timer listener connection was closed.')
+            await _load_timers()
+
+        # move cold timers which are now due soon into the hot table
+        if _migrate_at is None or now >= _migrate_at:
+            await _migrate_cold_timers()
+            _migrate_at = now + _MIGRATE_INTERVAL
+
+        # reload recurring timers when they change or try to take over dispatching them
+        if _reload_recurring or (not _recurring_leader and now >= _recurring_leader_retry_at):
+            await _load_recurring_timers(listener)
+
+        # sleep until the next timer or the end of the window
+        timer = _bot._current_timer = _peek()
+        deadlines = [_window_end, _migrate_at]
+        if timer is not None:
+            deadlines.append(timer.expires_at)
+        if _recurring_heap:
+            deadlines.append(_recurring_heap[0][0])
+        if not _recurring_leader:
+            deadlines.append(_recurring_leader_retry_at)
+
+        deadline = min(deadlines)
+        if deadline > now:
+            await _wait_until(deadline)
+            continue
+
+        # dispatch every timer which is due
+        _call_recurring_timers(now)
+        if timer is not None and timer.expires_at <= now:
+            await _call_timers(now)
+
+
+async def _dispatch_timers():
+    global _window_end, _migrate_at, _recurring_leader, _reload_recurring
+
+    # Start with an empty window, timers are reloaded from the database
+    _heap.clear()
+    _scheduled.clear()
+    _window_end = None
+    _migrate_at = None
+    _recurring.clear()
+    _recurring_heap.clear()
+    _recurring_leader = False
+    _reload_recurring = True
+
+    try:
+        # Listen for timers created or deleted by other processes on a dedicated connection
+        async with MaybeAcquire() as listener:
+            name = _Timers._name.rpartition('.')[2]
+            cold_name = _ColdTimers._name.rpartition('.')[2]
+            recurring_name = _RecurringTimers._name.rpartition('.')[2]
+
+            # Ensure timers tables exist, processes starting together create them one at a time
+            async with listener.transaction():
+                await listener.execute('SELECT pg_advisory_xact_lock(hashtext($1))', _Timers._name)
+                await _Timers.create(connection=listener)
+                await _ColdTimers.create(connection=listener)
+                await _RecurringTimers.create(connection=listener)
+
+                await listener.execute(_KWARGS_INDEX.format(table=_Timers._name, name=name))
+                await listener.execute(_KWARGS_INDEX.format(table=_ColdTimers._name, name=cold_name))
+                await listener.execute(_EXPIRES_AT_INDEX.format(table=_Timers._name, name=name))
+                await listener.execute(_EXPIRES_AT_INDEX.format(table=_ColdTimers._name, name=cold_name))
+                await listener.execute(_NOTIFY_TRIGGER.format(table=_Timers._name, name=name, channel=_NOTIFY_CHANNEL))
+                await listener.execute(_NOTIFY_TRIGGER.format(
+                    table=_RecurringTimers._name, name=recurring_name, channel=_RECURRING_NOTIFY_CHANNEL))
+
+            await listener.add_listener(_NOTIFY_CHANNEL, _on_notification)
+            await listener.add_listener(_RECURRING_NOTIFY_CHANNEL, _on_recurring_notification)
+
+            try:
+                await _run_dispatcher(listener)
+            finally:
+                if not listener.is_closed():
+                    await listener.remove_listener(_NOTIFY_CHANNEL, _on_notification)
+                    await listener.remove_listener(_RECURRING_NOTIFY_CHANNEL, _on_recurring_notification)
 
     except asyncio.CancelledError:
         pass
@@ -140,8 +691,17 @@ async def create_timer(expires_at: datetime.datetime, event_type: str, *args, **
 
     # Check if the timer expires relatively soon
     delta = (expires_at - now).total_seconds()
-    if delta <= 60:
-        _bot.loop.create_task(_call_short_timer(delta, timer))
+    if delta <= _SHORT_TIMER_SECONDS:
+        _schedule_short_timer(delta, timer)
+        return timer
+
+    # Store far future timers in the cold table until they are due soon
+    if delta > _HOT_HORIZON.total_seconds():
+        async with MaybeAcquire() as connection:
+            timer.id = await connection.fetchval(
+                f'''INSERT INTO {_ColdTimers._name} (id, created_at, expires_at, event_type, data)
+                VALUES (nextval(pg_get_serial_sequence($1, 'id')), $2, $3, $4, $5) RETURNING id''',
+                _Timers._name, now, expires_at, event_type, {'args': args, 'kwargs': kwargs})
         return timer
 
     # Store the timer in the database
@@ -156,16 +716,98 @@ async def create_timer(expires_at: datetime.datetime, event_type: str, *args, **
     # Set the timer's ID
     timer.id = record[0]
 
-    # Only set the data check if the timer can be waited for
-    if delta <= (60 * 60 * 24 * 40):
-        _bot._active_timer.set()
+    _preload((timer,))
+    return timer
 
-    # Check if the timer is earlier than the currently set timer
-    if _bot._current_timer and expires_at < _bot._current_timer.expires_at:
-        # Cancel the timer task and restart it
-        _bot._timer_task.cancel()
-        _bot._timer_task = _bot.loop.create_task(_dispatch_timers())
 
+async def create_timers(timers: Iterable[Tuple[datetime.datetime, str, Iterable[Any], Dict[str, Any]]], connection=None) -> List[Timer]:
+    """Creates many new timer objects at once.
+
+    Args:
+        timers (iterable): The timers to create, as tuples of
+            (expires_at, event_type, args, kwargs).
+        connection (asyncpg.Connection, optional): A database connection to use.
+            If none is supplied a connection will be acquired from the pool.
+    Returns:
+        list(Timer): The created timers in the order supplied.
+    """
+    now = datetime.datetime.utcnow()
+    created = []
+    to_store = []
+
+    for expires_at, event_type, args, kwargs in timers:
+        timer = Timer.temporary(now, expires_at, event_type, *args, **kwargs)
+        created.append(timer)
+
+        # Check if the timer expires relatively soon
+        delta = (expires_at - now).total_seconds()
+        if delta <= _SHORT_TIMER_SECONDS:
+            _schedule_short_timer(delta, timer)
+        else:
+            to_store.append(timer)
+
+    if not to_store:
+        return created
+
+    async with MaybeAcquire(connection) as connection:
+
+        # Reserve IDs for the timers up front so they can be matched to their rows
+        records = await connection.fetch(
+            'SELECT nextval(pg_get_serial_sequence($1, \'id\')) FROM generate_series(1, $2)', _Timers._name, len(to_store))
+        for timer, record in zip(to_store, records):
+            timer.id = record[0]
+
+        # Store the timers in the database with a single insert per table,
+        # far future timers are stored in the cold table until they are due soon
+        horizon = now + _HOT_HORIZON
+        hot = [timer for timer in to_store if timer.expires_at <= horizon]
+        cold = [timer for timer in to_store if timer.expires_at > horizon]
+
+        for table, rows in ((_Timers, hot), (_ColdTimers, cold)):
+            if not rows:
+                continue
+
+            query = f'''INSERT INTO {table._name} (id, created_at, expires_at, event_type, data)
+                SELECT id, $2, expires_at, event_type, data
+                FROM unnest($1::int[], $3::timestamp[], $4::text[], $5::jsonb[]) AS t(id, expires_at, event_type, data)'''
+            await connection.execute(
+                query,
+                [timer.id for timer in rows],
+                now,
+                [timer.expires_at for timer in rows],
+                [timer.event_type for timer in rows],
+                [{'args': timer.args, 'kwargs': timer.kwargs} for timer in rows]
+            )
+
+    _preload(hot)
+    return created
+
+
+async def create_recurring_timer(starts_at: datetime.datetime, interval: datetime.timedelta, event_type: str, *args, **kwargs):
+    """Creates a new timer which fires repeatedly at a fixed interval.
+
+    The timer is stored once and its occurrences are computed in memory,
+    occurrences missed while the bot is offline are skipped.
+
+    Args:
+        starts_at (datetime.datetime): when the timer first expires
+        interval (datetime.timedelta): the time between each occurrence
+        event_type (str): The timer event type
+        *args: Any additional arguments
+        **kwargs: Any additional keyword arguments
+    """
+    if interval <= datetime.timedelta():
+        raise ValueError('Recurring timer interval must be positive.')
+
+    async with MaybeAcquire() as connection:
+        record = await connection.fetchrow(
+            f'''INSERT INTO {_RecurringTimers._name} (created_at, expires_at, interval, event_type, data)
+            VALUES ($1, $2, $3, $4, $5) RETURNING *''',
+            datetime.datetime.utcnow(), starts_at, interval, event_type, {'args': args, 'kwargs': kwargs})
+
+    # the dispatching process picks up the timer from the insert notification
+    timer = RecurringTimer(record)
+    timer.expires_at = timer.next_occurrence(datetime.datetime.utcnow())
     return timer
 
 
@@ -176,8 +818,74 @@ async def delete_timer(record: asyncpg.Record):
         record (asyncpg.Record): the timer's database record to delete.
     """
     await _Timers.delete_record(record)
+    await _ColdTimers.delete_record(record)
 
-    # if the current timer is being deleted
-    if _bot._current_timer and _bot._current_timer.id == id:
-        _bot._timer_task.cancel()
-        _bot._timer_task = _bot.loop.create_task(_dispatch_timers())
+    # remove the timer from the dispatch window
+    _unschedule(record['id'])
+
+
+async def cancel_timer(timer: Timer) -> bool:
+    """Cancels an upcoming timer.
+
+    Args:
+        timer (Timer): The timer to cancel, as returned by `create_timer`.
+    Returns:
+        bool: Whether the timer was cancelled before it expired.
+    """
+    # Short timers only exist in memory
+    if timer.id < 0:
+        return _wheel.cancel(timer.id) is not None
+
+    # Recurring timers are removed by the dispatching process from the delete notification
+    if isinstance(timer, RecurringTimer):
+        async with MaybeAcquire() as connection:
+            status = await connection.execute(f'DELETE FROM {_RecurringTimers._name} WHERE id = $1', timer.id)
+        return status != 'DELETE 0'
+
+    async with MaybeAcquire() as connection:
+        status = await connection.execute(f'DELETE FROM {_Timers._name} WHERE id = $1', timer.id)
+        if status == 'DELETE 0':
+            status = await connection.execute(f'DELETE FROM {_ColdTimers._name} WHERE id = $1', timer.id)
+
+    # remove the timer from the dispatch window
+    _unschedule(timer.id)
+    return status != 'DELETE 0'
+
+
+async def cancel_timers(event_type: str, **kwargs) -> int:
+    """Cancels every upcoming timer of an event type with matching keyword arguments.
+
+    Example:
+        await cancel_timers('mute', guild_id=guild.id, member_id=member.id)
+
+    Args:
+        event_type (str): The timer event type.
+        **kwargs: The keyword arguments the timers must have been created with.
+            Timers with additional keyword arguments are also cancelled.
+    Returns:
+        int: The number of timers cancelled.
+    """
+    # Short timers only exist in memory
+    def check(timer):
+        if timer.event_type != event_type:
+            return False
+        return all(key in timer.kwargs and timer.kwargs[key] == value for key, value in kwargs.items())
+
+    short_timers = [timer.id for timer in _wheel.timers() if check(timer)]
+    for timer_id in short_timers:
+        _wheel.cancel(timer_id)
+
+    # Stored timers are matched using the index on their keyword arguments
+    async with MaybeAcquire() as connection:
+        records = await connection.fetch(
+            f"DELETE FROM {_Timers._name} WHERE event_type = $1 AND data -> 'kwargs' @> $2::jsonb RETURNING id", event_type, kwargs)
+        cold = await connection.fetch(
+            f"DELETE FROM {_ColdTimers._name} WHERE event_type = $1 AND data -> 'kwargs' @> $2::jsonb RETURNING id", event_type, kwargs)
+        recurring = await connection.fetch(
+            f"DELETE FROM {_RecurringTimers._name} WHERE event_type = $1 AND data -> 'kwargs' @> $2::jsonb RETURNING id", event_type, kwargs)
+
+    # remove the timers from the dispatch window
+    for record in records:
+        _unschedule(record['id'])
+
+    return len(short_timers) + len(records) + len(cold) + len(recurring)
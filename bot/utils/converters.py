@@ -1,4 +1,6 @@
+import datetime
 import json
+import re
 
 import discord
 from discord.ext import commands
@@ -64,3 +66,18 @@ class Embed(commands.Converter):
         except Exception:
             raise commands.BadArgument(
                 'Could not generate embed from supplied JSON.')
+
+
+class Duration(commands.Converter):
+    """Converts a duration such as `1w2d`, `12h` or `30m` to a :class:`datetime.timedelta`."""
+    _UNITS = {'w': 'weeks', 'd': 'days', 'h': 'hours', 'm': 'minutes', 's': 'seconds'}
+    _PATTERN = re.compile(r'(\d+)([wdhms])')
+
+    async def convert(self, ctx: commands.Context, argument: str):
+        argument = argument.lower()
+        parts = self._PATTERN.findall(argument)
+
+        if not parts or ''.join(n + u for n, u in parts) != argument:
+            raise commands.BadArgument(f'Could not convert "{argument}" to a duration.')
+
+        return datetime.timedelta(**{self._UNITS[u]: int(n) for n, u in parts})
@@ -0,0 +1,96 @@
+import json
+import time
+
+from collections import defaultdict
+
+from discord import gateway
+
+from bot.utils.rolling import RollingCounter
+
+_received_message = gateway.DiscordWebSocket.received_message
+
+# Compressed bytes received towards the payload currently being buffered
+_pending_compressed = 0
+
+# Number of extensions using the gateway hooks
+_installs = 0
+
+# A recorder which is passed every decoded payload, see bot.utils.recorder
+recorder = None
+
+
+class PayloadStats:
+    """Size and decode cost of the gateway payloads received for an event type."""
+    __slots__ = ('payloads', 'raw_bytes', 'compressed_bytes', 'decode_time', 'raw_rate')
+
+    def __init__(self):
+        self.payloads = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.decode_time = 0.0
+        self.raw_rate = RollingCounter(60)
+
+    @property
+    def average_decode_time(self) -> float:
+        return self.decode_time / self.payloads if self.payloads else 0.0
+
+
+# Payload statistics keyed by event type, non-dispatch payloads are keyed by None
+stats = defaultdict(PayloadStats)
+
+
+class _TimedJSON:
+    """Stands in for the json module in discord's gateway, timing payload decodes."""
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+    def loads(self, s, **kwargs):
+        global _pending_compressed
+
+        started_at = time.perf_counter()
+        payload = json.loads(s, **kwargs)
+        elapsed = time.perf_counter() - started_at
+
+        # Payloads are almost always ASCII, for which the length is already known
+        size = len(s) if s.isascii() else len(s.encode())
+
+        payload_stats = stats[payload.get('t')]
+        payload_stats.payloads += 1
+        payload_stats.raw_bytes += size
+        payload_stats.compressed_bytes += _pending_compressed or size
+        payload_stats.decode_time += elapsed
+        payload_stats.raw_rate.increment(size)
+        _pending_compressed = 0
+
+        if recorder is not None:
+            recorder.record(s, payload.get('op'))
+
+        return payload
+
+
+async def _timed_received_message(self, msg):
+    global _pending_compressed
+    if type(msg) is bytes:
+        _pending_compressed += len(msg)
+
+    # Decoding happens before the first await, so the pending bytes belong to this payload
+    return await _received_message(self, msg)
+
+
+def install():
+    """Starts accounting for the payloads received by the gateway."""
+    global _installs
+    _installs += 1
+    gateway.json = _TimedJSON()
+    gateway.DiscordWebSocket.received_message = _timed_received_message
+
+
+def uninstall():
+    """Stops accounting for the payloads received by the gateway once no extension uses it."""
+    global _installs, _pending_compressed
+    _installs = max(_installs - 1, 0)
+    if not _installs:
+        gateway.json = json
+        gateway.DiscordWebSocket.received_message = _received_message
+        _pending_compressed = 0
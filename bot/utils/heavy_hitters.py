@@ -0,0 +1,108 @@
+import time
+
+from array import array
+from typing import List, Tuple
+
+from bot.utils.hyperloglog import mix64
+
+
+class HeavyHitters:
+    """Tracks the approximately most frequent integers over a sliding window.
+
+    Counts are kept in a count-min sketch per interval of the window, along
+    with a running total of every interval's sketch, so memory use is fixed
+    and counts expire one interval at a time. The `k` keys with the highest
+    estimates are kept as candidates so the top keys can be read in O(k).
+
+    Args:
+        k (int): The number of most frequent keys to track.
+        window (float): The length of the window in seconds.
+        intervals (int, optional): The number of intervals the window is divided into.
+            Defaults to 12.
+        width (int, optional): The number of counters per row of each sketch,
+            must be a power of two. Defaults to 1024.
+        depth (int, optional): The number of rows of each sketch, at most 4.
+            Defaults to 4.
+    """
+    __slots__ = ('k', 'window', 'width', 'depth', '_interval', '_sketches', '_total', '_current', '_candidates', '_floor')
+
+    def __init__(self, k: int, window: float, intervals: int = 12, width: int = 1024, depth: int = 4):
+        if width & (width - 1) or not 1 <= depth <= 4:
+            raise ValueError('Width must be a power of two and depth between 1 and 4.')
+
+        self.k = k
+        self.window = window
+        self.width = width
+        self.depth = depth
+        self._interval = window / intervals
+        self._sketches = [array('q', bytes(8 * width * depth)) for _ in range(intervals)]
+        self._total = array('q', bytes(8 * width * depth))
+        self._current = int(time.monotonic() // self._interval)
+        self._candidates = {}
+        self._floor = 0
+
+    def _indexes(self, key: int):
+        # Each row is indexed by a separate 16 bit slice of a single hash
+        hashed = mix64(key)
+        return [row * self.width + ((hashed >> (16 * row)) & (self.width - 1)) for row in range(self.depth)]
+
+    def _advance(self, now: float):
+        current = int(now // self._interval)
+        if current == self._current:
+            return
+
+        # Expire the intervals which have left the window
+        for interval in range(self._current + 1, min(current, self._current + len(self._sketches)) + 1):
+            sketch = self._sketches[interval % len(self._sketches)]
+            self._total = array('q', map(int.__sub__, self._total, sketch))
+            self._sketches[interval % len(self._sketches)] = array('q', bytes(len(sketch) * 8))
+        self._current = current
+
+        self._candidates = {key: self.estimate(key, now) for key in self._candidates}
+        self._candidates = {key: count for key, count in self._candidates.items() if count > 0}
+        self._floor = min(self._candidates.values(), default=0)
+
+    def add(self, key: int, count: int = 1, now: float = None):
+        """Counts an occurrence of a key.
+
+        Args:
+            key (int): The key to count.
+            count (int, optional): How many occurrences to count.
+            now (float, optional): The current :func:`time.monotonic` time.
+        """
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+
+        sketch = self._sketches[self._current % len(self._sketches)]
+        estimate = None
+        for index in self._indexes(key):
+            sketch[index] += count
+            self._total[index] += count
+            if estimate is None or self._total[index] < estimate:
+                estimate = self._total[index]
+
+        if key in self._candidates:
+            previous, self._candidates[key] = self._candidates[key], estimate
+            if previous == self._floor:
+                self._floor = min(self._candidates.values())
+        elif len(self._candidates) < self.k:
+            self._candidates[key] = estimate
+            self._floor = min(self._floor, estimate) if len(self._candidates) > 1 else estimate
+        elif estimate > self._floor:
+            # Replace the least frequent candidate
+            del self._candidates[min(self._candidates, key=self._candidates.__getitem__)]
+            self._candidates[key] = estimate
+            self._floor = min(self._candidates.values())
+
+    def estimate(self, key: int, now: float = None) -> int:
+        """Returns an upper bound on the occurrences of a key within the window."""
+        self._advance(time.monotonic() if now is None else now)
+        return min(self._total[index] for index in self._indexes(key))
+
+    def top(self, now: float = None) -> List[Tuple[int, int]]:
+        """Returns the most frequent keys in the window and their estimated counts, most frequent first."""
+        self._advance(time.monotonic() if now is None else now)
+        return sorted(self._candidates.items(), key=lambda item: -item[1])
+
+    def __repr__(self):
+        return f'<HeavyHitters k={self.k} window={self.window} candidates={len(self._candidates)}>'
@@ -0,0 +1,106 @@
+import math
+
+from collections import Counter
+
+
+class Histogram:
+    """A mergeable log-linear histogram of non-negative values.
+
+    Values are counted in buckets whose width grows with their magnitude,
+    so memory use depends only on the range of values recorded and each
+    reported value is within 1 / `precision` of the value recorded.
+
+    Args:
+        precision (int, optional): The number of buckets per power of two.
+            Defaults to 32.
+    """
+    __slots__ = ('precision', 'count', 'total', 'min', 'max', '_buckets')
+
+    def __init__(self, precision: int = 32):
+        self.precision = precision
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = Counter()
+
+    def _index(self, value: float) -> int:
+        if value <= 0:
+            return None
+        mantissa, exponent = math.frexp(value)
+        return exponent * self.precision + int((mantissa - 0.5) * 2 * self.precision)
+
+    def _value(self, index: int) -> float:
+        if index is None:
+            return 0.0
+        exponent, sub_bucket = divmod(index, self.precision)
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2 * self.precision), exponent)
+
+    def record(self, value: float, count: int = 1):
+        """Records a value in the histogram.
+
+        Args:
+            value (float): The value to record, negative values are recorded as zero.
+            count (int, optional): How many times to record the value.
+        """
+        value = max(value, 0.0)
+        self._buckets[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'Histogram'):
+        """Adds the values recorded in another histogram of the same precision to this one."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge histograms of differing precision.')
+
+        self._buckets.update(other._buckets)
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """Returns the approximate value at a percentile between 0 and 100."""
+        return self.percentiles(percentile)[0]
+
+    def percentiles(self, *percentiles: float) -> list:
+        """Returns the approximate values at each percentile between 0 and 100."""
+        if not self.count:
+            return [0.0 for _ in percentiles]
+
+        ranks = sorted((max(math.ceil(self.count * p / 100), 1), i) for i, p in enumerate(percentiles))
+        values = [self.max] * len(percentiles)
+
+        # Walk the buckets in order of value until each rank is reached
+        seen = 0
+        for index in sorted(self._buckets, key=lambda i: -math.inf if i is None else i):
+            seen += self._buckets[index]
+            while ranks and ranks[0][0] <= seen:
+                values[ranks.pop(0)[1]] = min(max(self._value(index), self.min), self.max)
+            if not ranks:
+                break
+
+        return values
+
+    def cumulative(self, bounds: list) -> list:
+        """Returns the approximate number of values at most each of the ascending bounds."""
+        counts = []
+        seen = 0
+        for index in sorted(self._buckets, key=lambda i: -math.inf if i is None else i):
+            value = self._value(index)
+            while len(counts) < len(bounds) and bounds[len(counts)] < value:
+                counts.append(seen)
+            seen += self._buckets[index]
+
+        counts.extend(seen for _ in range(len(bounds) - len(counts)))
+        return counts
+
+    def __repr__(self):
+        return f'<Histogram count={self.count} min={self.min} max={self.max} mean={self.mean}>'
@@ -0,0 +1,130 @@
+import math
+import struct
+
+_MASK = (1 << 64) - 1
+
+# Register values are at most 64, so their reciprocal powers of two can be looked up
+_POWERS = [2.0 ** -rank for rank in range(66)]
+
+# Sparse sketches are serialised as a flag and their precision, followed by each set register's index and value.
+# Dense registers are never above 64, so the flag distinguishes the two forms
+_SPARSE_FLAG = 0x80
+_SPARSE_ENTRY = struct.Struct('>HB')
+
+
+def mix64(value: int) -> int:
+    """Scrambles an integer into a well distributed 64 bit hash.
+
+    Python's own hash of an int is the int itself, which is unsuitable for sketches.
+    """
+    # splitmix64 finaliser
+    value = (value + 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+class HyperLogLog:
+    """A mergeable sketch estimating the number of distinct integers added to it.
+
+    Sketches start sparse, storing only the registers which have been set, and
+    switch to a fixed 2 ** `precision` bytes once more than 1/32 of the registers
+    are set. The standard error is around 1.04 / sqrt(2 ** `precision`).
+
+    Args:
+        precision (int, optional): The number of bits used to select a register,
+            between 4 and 16. Defaults to 12.
+    """
+    __slots__ = ('precision', '_registers', '_sparse')
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError('Precision must be between 4 and 16.')
+
+        self.precision = precision
+        self._registers = None
+        self._sparse = {}
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._registers is None
+
+    def _densify(self):
+        if self._registers is None:
+            self._registers = bytearray(1 << self.precision)
+            for index, rank in self._sparse.items():
+                self._registers[index] = rank
+            self._sparse = None
+
+    def _set(self, index: int, rank: int):
+        if self._registers is not None:
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+        elif rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > (1 << self.precision) >> 5:
+                self._densify()
+
+    def add(self, value: int):
+        """Adds an integer to the sketch.
+
+        Args:
+            value (int): The value to add.
+        """
+        hashed = mix64(value)
+        width = 64 - self.precision
+        self._set(hashed >> width, width - (hashed & ((1 << width) - 1)).bit_length() + 1)
+
+    def merge(self, other: 'HyperLogLog'):
+        """Adds the values added to another sketch of the same precision to this one."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of differing precision.')
+
+        if other._registers is None:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+        else:
+            self._densify()
+            self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def count(self) -> int:
+        """Returns the estimated number of distinct values added to the sketch."""
+        m = 1 << self.precision
+        if self._registers is None:
+            zeros = m - len(self._sparse)
+            total = zeros + sum(map(_POWERS.__getitem__, self._sparse.values()))
+        else:
+            zeros = self._registers.count(0)
+            total = sum(map(_POWERS.__getitem__, self._registers))
+
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / total
+
+        # Use linear counting while many registers are still empty
+        if zeros and estimate <= 2.5 * m:
+            estimate = m * math.log(m / zeros)
+
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        if self._registers is not None:
+            return bytes(self._registers)
+
+        return bytes([_SPARSE_FLAG | self.precision]) + b''.join(
+            _SPARSE_ENTRY.pack(index, rank) for index, rank in sorted(self._sparse.items()))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Creates a sketch from the output of :meth:`to_bytes`."""
+        if data[0] & _SPARSE_FLAG:
+            sketch = cls(data[0] & ~_SPARSE_FLAG)
+            sketch._sparse = dict(_SPARSE_ENTRY.iter_unpack(data[1:]))
+            return sketch
+
+        sketch = cls(len(data).bit_length() - 1)
+        sketch._registers = bytearray(data)
+        sketch._sparse = None
+        return sketch
+
+    def __repr__(self):
+        return f'<HyperLogLog precision={self.precision} sparse={self.is_sparse} count={self.count()}>'
@@ -0,0 +1,118 @@
+import asyncio
+import collections
+import datetime
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from bot.utils.histogram import Histogram
+
+
+class LoopMonitor:
+    """Continuously measures how late an event loop runs its callbacks.
+
+    A task sleeps for `interval` seconds at a time and records how late it
+    wakes in a histogram per minute. A watchdog thread captures the stack of
+    the event loop's thread whenever the task has been stalled for longer than
+    `threshold` seconds, identifying the callback blocking the loop.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The event loop to monitor.
+        interval (float, optional): Seconds between measurements. Defaults to 0.1.
+        threshold (float, optional): Seconds of lag considered a spike. Defaults to 0.25.
+        minutes (int, optional): Minutes of measurements to keep. Defaults to 15.
+        log (logging.Logger, optional): Where captured stacks are logged.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, *, interval: float = 0.1, threshold: float = 0.25,
+                 minutes: int = 15, log: logging.Logger = None):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.log = log or logging.getLogger(__name__)
+
+        # The most recent spikes as tuples of (time, seconds stalled, stack)
+        self.spikes = collections.deque(maxlen=10)
+
+        # Lag since the monitor started, and per minute for the most recent minutes
+        self.lag = Histogram()
+        self._minutes = [(None, Histogram()) for _ in range(minutes)]
+        self._heartbeat = None
+        self._loop_thread = None
+        self._task = None
+        self._stopped = threading.Event()
+
+        # The heartbeat of the stall the last spike was captured in, guarded by the lock
+        self._captured = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts monitoring the event loop."""
+        self._stopped.clear()
+        self._task = self.loop.create_task(self._run())
+        threading.Thread(target=self._watch, name='LoopMonitor', daemon=True).start()
+
+    def stop(self):
+        """Stops monitoring the event loop."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def _record(self, lag: float):
+        minute = int(time.monotonic() // 60)
+        slot = minute % len(self._minutes)
+        if self._minutes[slot][0] != minute:
+            self._minutes[slot] = (minute, Histogram())
+        self._minutes[slot][1].record(lag)
+        self.lag.record(lag)
+
+    async def _run(self):
+        self._loop_thread = threading.get_ident()
+        while True:
+            heartbeat = self._heartbeat = time.monotonic()
+            expected = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(self.loop.time() - expected, 0.0)
+            self._record(lag)
+
+            # Spikes are captured as the stall begins, so are given their full length once it ends
+            with self._lock:
+                if self._captured == heartbeat:
+                    at, _, stack = self.spikes[-1]
+                    self.spikes[-1] = (at, lag, stack)
+                    self._captured = None
+
+    def _watch(self):
+        captured = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            if heartbeat is None or heartbeat == captured:
+                continue
+
+            # Capture the loop thread's stack once per stall
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                stack = ''.join(traceback.format_stack(frame))
+                captured = heartbeat
+
+                with self._lock:
+                    self.spikes.append((datetime.datetime.utcnow(), stalled, stack))
+                    self._captured = heartbeat
+                self.log.warning(f'Event loop blocked for over {stalled * 1000:.0f}ms in:\n{stack}')
+
+    def histogram(self, minutes: int) -> Histogram:
+        """Returns the lag measured over the last `minutes` minutes, including the current minute."""
+        current = int(time.monotonic() // 60)
+        merged = Histogram()
+        for minute, histogram in self._minutes:
+            if minute is not None and current - minute < minutes:
+                merged.merge(histogram)
+        return merged
+
+    def __repr__(self):
+        return f'<LoopMonitor interval={self.interval} threshold={self.threshold} spikes={len(self.spikes)}>'
@@ -0,0 +1,119 @@
+import datetime
+import glob
+import gzip
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from typing import Iterable, Iterator, Tuple
+
+# Each record is the time it was received, its opcode and the length of the JSON payload which follows
+_HEADER = struct.Struct('<dBI')
+
+
+class GatewayRecorder:
+    """Records raw gateway payloads to rotating gzip files.
+
+    Payloads are queued and written from a separate thread so recording does
+    not block the event loop. Each record is length-prefixed, see :func:`read_recording`.
+
+    Args:
+        directory (str): The directory recordings are written to.
+        max_file_size (int, optional): Compressed bytes written to a file before starting another.
+            Defaults to 64 MiB.
+        max_files (int, optional): The number of most recent files kept. Defaults to 10.
+    """
+
+    def __init__(self, directory: str, *, max_file_size: int = 64 * 1024 * 1024, max_files: int = 10):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+
+        self.path = None
+        self.recorded = 0
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        """Starts writing queued payloads."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name='GatewayRecorder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops recording once the queued payloads are written."""
+        self._queue.put(None)
+
+    def record(self, payload: str, op: int):
+        """Queues a raw payload to be written.
+
+        Args:
+            payload (str): The payload's JSON.
+            op (int): The payload's gateway opcode.
+        """
+        self._queue.put((time.time(), op, payload))
+        self.recorded += 1
+
+    def _open(self):
+        self.path = os.path.join(self.directory, f'gateway-{datetime.datetime.utcnow():%Y%m%d-%H%M%S-%f}.rec.gz')
+        raw = open(self.path, 'wb')
+        return raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+
+    def _rotate(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, 'gateway-*.rec.gz')))
+        for path in paths[:-self.max_files]:
+            os.remove(path)
+
+    def _write(self):
+        raw, file = self._open()
+        self._rotate()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+
+                timestamp, op, payload = item
+                payload = payload.encode()
+                file.write(_HEADER.pack(timestamp, op or 0, len(payload)))
+                file.write(payload)
+
+                if raw.tell() >= self.max_file_size:
+                    file.close()
+                    raw.close()
+                    raw, file = self._open()
+                    self._rotate()
+        finally:
+            file.close()
+            raw.close()
+
+
+def read_recording(paths: Iterable[str]) -> Iterator[Tuple[float, int, str]]:
+    """Reads the records of recording files in order.
+
+    A file truncated by the recorder being interrupted is read up to its last complete record.
+
+    Args:
+        paths (Iterable[str]): The paths of the files to read.
+
+    Yields:
+        Tuple[float, int, str]: The time each payload was received, its opcode and its JSON.
+    """
+    for path in paths:
+        with gzip.open(path, 'rb') as file:
+            try:
+                while True:
+                    header = file.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    timestamp, op, length = _HEADER.unpack(header)
+                    payload = file.read(length)
+                    if len(payload) < length:
+                        break
+                    yield timestamp, op, payload.decode()
+            except (EOFError, zlib.error):
+                pass
@@ -0,0 +1,58 @@
+import time
+
+from array import array
+
+
+class RollingCounter:
+    """Counts occurrences in per-second slots of a fixed-size ring buffer.
+
+    Incrementing is O(1) amortised, slots are cleared as time passes them.
+
+    Args:
+        seconds (int, optional): The number of seconds of history to keep.
+            Defaults to 900.
+    """
+    __slots__ = ('_counts', '_second')
+
+    def __init__(self, seconds: int = 900):
+        self._counts = array('Q', bytes(8 * seconds))
+        self._second = int(time.monotonic())
+
+    def _advance(self, second: int):
+        if second <= self._second:
+            return
+
+        # Clear the slots of the seconds which have passed since the last update
+        size = len(self._counts)
+        for passed in range(self._second + 1, min(second, self._second + size) + 1):
+            self._counts[passed % size] = 0
+        self._second = second
+
+    def increment(self, count: int = 1, now: float = None):
+        """Counts occurrences in the current second.
+
+        Args:
+            count (int, optional): The number of occurrences.
+            now (float, optional): The current :func:`time.monotonic` time.
+        """
+        second = int(time.monotonic() if now is None else now)
+        self._advance(second)
+        self._counts[second % len(self._counts)] += count
+
+    def _window(self, seconds: int, now: float = None):
+        second = int(time.monotonic() if now is None else now)
+        self._advance(second)
+        size = len(self._counts)
+        seconds = min(seconds, size)
+        return (self._counts[s % size] for s in range(second - seconds + 1, second + 1))
+
+    def rate(self, seconds: int, now: float = None) -> float:
+        """Returns the average occurrences per second over the last `seconds` seconds."""
+        return sum(self._window(seconds, now)) / min(seconds, len(self._counts))
+
+    def peak(self, seconds: int, now: float = None) -> int:
+        """Returns the most occurrences in a single second over the last `seconds` seconds."""
+        return max(self._window(seconds, now))
+
+    def __repr__(self):
+        return f'<RollingCounter seconds={len(self._counts)}>'
@@ -0,0 +1,111 @@
+"""
+Checks that several timer dispatchers sharing a database dispatch each timer exactly once.
+
+The tests need a disposable PostgreSQL database, as the timers tables are emptied:
+
+    TEST_POSTGRES_DSN=postgresql://localhost/ditto_test python -m unittest discover -s tests
+
+"""
+
+import asyncio
+import collections
+import datetime
+import multiprocessing
+import os
+import unittest
+
+from donphan import MaybeAcquire, create_pool
+
+import bot.timers as timers
+
+_DSN = os.environ.get('TEST_POSTGRES_DSN')
+
+_DISPATCHERS = 3
+_TIMERS = 5000
+# Seconds before the timers are due, so every dispatcher has started by then
+_DUE_IN = 3
+# Seconds each dispatcher runs for
+_RUN_FOR = 15
+
+
+class _Bot:
+    """The parts of a bot the timer dispatcher uses, recording the timers dispatched."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatched = []
+        self._active_timer = asyncio.Event()
+        self._current_timer = None
+        self._timer_task = None
+
+    def is_closed(self) -> bool:
+        return False
+
+    def dispatch(self, event_name: str, *args, **kwargs):
+        if event_name == 'test_timer_complete':
+            self.dispatched.append(args[0])
+
+
+def _run_dispatcher(dsn: str, results: multiprocessing.Queue):
+    # Each dispatcher runs in its own process, as the dispatcher's state is module level
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def run():
+        await create_pool(dsn)
+        bot = timers._bot = _Bot(loop)
+        bot._timer_task = loop.create_task(timers._dispatch_timers())
+        await asyncio.sleep(_RUN_FOR)
+        bot._timer_task.cancel()
+        return bot.dispatched
+
+    results.put(loop.run_until_complete(run()))
+
+
+@unittest.skipUnless(_DSN, 'TEST_POSTGRES_DSN is not set')
+class TestConcurrentDispatch(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._create_timers())
+
+    def tearDown(self):
+        self.loop.close()
+
+    async def _create_timers(self):
+        await create_pool(_DSN)
+        await timers._Timers.create()
+        await timers._ColdTimers.create()
+        await timers._RecurringTimers.create()
+
+        async with MaybeAcquire() as connection:
+            await connection.execute(f'TRUNCATE {timers._Timers._name}, {timers._ColdTimers._name}')
+            await connection.execute(f"""
+                INSERT INTO {timers._Timers._name} (expires_at, event_type, data)
+                SELECT (NOW() AT TIME ZONE 'UTC') + $1::interval, 'test', jsonb_build_object('args', jsonb_build_array(g))
+                FROM generate_series(1, $2) AS g
+            """, datetime.timedelta(seconds=_DUE_IN), _TIMERS)
+
+    async def _remaining(self):
+        async with MaybeAcquire() as connection:
+            return await connection.fetchval(f'SELECT COUNT(*) FROM {timers._Timers._name}')
+
+    def test_each_timer_dispatched_once(self):
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [context.Process(target=_run_dispatcher, args=(_DSN, results)) for _ in range(_DISPATCHERS)]
+        for process in processes:
+            process.start()
+
+        dispatched = [results.get(timeout=_RUN_FOR + 30) for _ in processes]
+        for process in processes:
+            process.join()
+
+        counts = collections.Counter(timer for timers_dispatched in dispatched for timer in timers_dispatched)
+        self.assertEqual(set(counts), set(range(1, _TIMERS + 1)))
+        self.assertEqual([timer for timer, count in counts.items() if count > 1], [])
+        self.assertEqual(self.loop.run_until_complete(self._remaining()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()